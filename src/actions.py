@@ -1,11 +1,24 @@
-from typing import List, Dict, Any, Optional
+from typing import List, Dict, Any, Iterable, Optional
 import os
-import json
+
+# 已随流程包载入内存的模板路径，验证时视为存在
+_resident_templates = set()
+
+
+def register_resident_templates(paths: Iterable[str]):
+    """登记已载入内存的模板，这些路径在磁盘上不存在也能通过验证"""
+    _resident_templates.update(os.path.abspath(path) for path in paths)
+
+
+def template_exists(path: str) -> bool:
+    return os.path.abspath(path) in _resident_templates or os.path.exists(path)
 class ActionType:
     # 基础动作
     CLICK = "click"
+    BATCH_CLICK = "batch_click"
     FIND = "find"
     WAIT = "wait"
+    WAIT_FOR = "wait_for"  # 等待图像出现或消失
     
     # 流程控制
     LOOP = "loop"
@@ -16,11 +29,44 @@ class ActionType:
     SEQUENCE = "sequence"  # 新增动作序列
     CUSTOM = "custom"      # 新增自定义动作
 
+class ColorMode:
+    """模板匹配使用的颜色空间，颜色无关的按钮用单通道可将匹配耗时降到约三分之一"""
+    BGR = "bgr"       # 彩色三通道
+    GRAY = "gray"     # 灰度
+    BLUE = "b"        # 单个颜色通道
+    GREEN = "g"
+    RED = "r"
+    EDGE = "edge"     # 灰度边缘图，适合颜色或亮度会变化的图标
+
+    ALL = (BGR, GRAY, BLUE, GREEN, RED, EDGE)
+    LABELS = {
+        BGR: "彩色",
+        GRAY: "灰度",
+        BLUE: "蓝色通道",
+        GREEN: "绿色通道",
+        RED: "红色通道",
+        EDGE: "边缘",
+    }
+
 class Action:
-    def __init__(self, type: str, params: dict):
+    # 大流程可能有数十万个动作，不使用实例字典
+    __slots__ = ('type', 'params', '_description')
+
+    def __init__(self, type: str, params: dict, description: Optional[str] = None):
         self.type = type
         self.params = params
-        self.description = self._generate_description()
+        self._description = description
+
+    @property
+    def description(self) -> str:
+        """动作描述，未指定时在首次使用时生成"""
+        if self._description is None:
+            self._description = self._generate_description()
+        return self._description
+
+    @description.setter
+    def description(self, value: str):
+        self._description = value
 
     def _generate_description(self) -> str:
         """生成动作描述"""
@@ -32,9 +78,14 @@ class Action:
             return f"查找图像: {self.params.get('template_path', '')}"
         elif self.type == ActionType.WAIT:
             return f"等待 {self.params.get('duration', 0)} 秒"
+        elif self.type == ActionType.WAIT_FOR:
+            state = "出现" if self.params.get('appear', True) else "消失"
+            return f"等待图像{state}: {self.params.get('template_path', '')}"
         elif self.type == ActionType.LOOP:
             return f"循环执行 {self.params.get('count', 0)} 次"
         elif self.type == ActionType.CONDITION:
+            if 'template_paths' in self.params:
+                return f"条件判断: {len(self.params['template_paths'])} 个模板之一"
             return f"条件判断: {self.params.get('template_path', '')}"
         elif self.type == ActionType.PARALLEL:
             return f"并行执行 {len(self.params.get('actions', []))} 个动作"
@@ -51,17 +102,29 @@ class Action:
 
     @staticmethod
     def from_dict(data: Dict[str, Any]) -> 'Action':
-        action = Action(data['type'], data['params'])
-        action.description = data.get('description', action._generate_description())
-        return action
+        return Action(data['type'], data['params'], data.get('description'))
 
     def validate(self) -> Optional[str]:
         """验证动作参数是否有效"""
-        if self.type == ActionType.CLICK or self.type == ActionType.FIND or self.type == ActionType.CONDITION:
+        if 'color_mode' in self.params and self.params['color_mode'] not in ColorMode.ALL:
+            return f"不支持的颜色模式: {self.params['color_mode']}"
+        if 'scales' in self.params:
+            scales = self.params['scales']
+            if not isinstance(scales, list) or not scales or not all(isinstance(s, (int, float)) and s > 0 for s in scales):
+                return "缩放比例必须是正数列表"
+        if self.type == ActionType.CONDITION and 'template_paths' in self.params:
+            if not isinstance(self.params['template_paths'], list) or not self.params['template_paths']:
+                return "模板路径列表不能为空"
+            for path in self.params['template_paths']:
+                if not template_exists(path):
+                    return f"模板文件不存在: {path}"
+        elif self.type in (ActionType.CLICK, ActionType.BATCH_CLICK, ActionType.FIND, ActionType.CONDITION, ActionType.WAIT_FOR):
             if 'template_path' not in self.params:
                 return "缺少模板路径"
-            if not os.path.exists(self.params['template_path']):
+            if not template_exists(self.params['template_path']):
                 return "模板文件不存在"
+            if self.type == ActionType.WAIT_FOR and self.params.get('timeout', 10) <= 0:
+                return "超时时间必须大于0"
         elif self.type == ActionType.WAIT:
             if 'duration' not in self.params:
                 return "缺少等待时间"
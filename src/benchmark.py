@@ -0,0 +1,558 @@
+"""离线基准测试
+
+在合成画面上测量图像匹配的耗时与准确率，无需桌面环境：
+
+    python benchmark.py pyramid --click-dir ../click
+    python benchmark.py interpreter --steps 10000
+    python benchmark.py imports
+    python benchmark.py modes --click-dir ../click
+    python benchmark.py backends --multi-scale
+    python benchmark.py gate --polls 50
+    python benchmark.py suite --output base.json
+    python benchmark.py compare base.json new.json
+"""
+import os
+import sys
+import json
+import time
+import argparse
+import subprocess
+import tempfile
+import threading
+import statistics
+import platform
+from typing import Callable, Dict, List, Optional, Tuple
+import cv2
+import numpy as np
+from screen import ReplayScreenSource
+from actions import ActionType, ColorMode
+from engine import ImageMatcher, AutomationEngine, BACKEND_PROCESS, BACKEND_THREAD
+from interpreter import Compiler, Interpreter
+
+DEFAULT_CLICK_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'click')
+
+
+def list_templates(click_dir: str) -> List[str]:
+    """列出目录下的模板图像"""
+    return sorted(
+        os.path.join(click_dir, name) for name in os.listdir(click_dir)
+        if name.lower().endswith(('.png', '.jpg', '.bmp'))
+    )
+
+
+def synthesize_instances(template_paths: List[str], size: Tuple[int, int] = (2560, 1440), seed: int = 0,
+                         scale: float = 1.0, noise: float = 0.0, copies: int = 1) -> Tuple[np.ndarray, Dict[str, List[Tuple[int, int]]]]:
+    """将模板按 scale 缩放后贴到平滑噪声背景上互不重叠的随机位置，每个模板 copies 份，
+    再叠加标准差为 noise 的高斯噪声，返回画面及各模板所有副本的中心点"""
+    rng = np.random.default_rng(seed)
+    width, height = size
+    background = rng.integers(0, 256, (height // 8, width // 8, 3), dtype=np.uint8)
+    frame = cv2.resize(background, (width, height), interpolation=cv2.INTER_CUBIC)
+    occupied: List[Tuple[int, int, int, int]] = []
+    truth: Dict[str, List[Tuple[int, int]]] = {}
+    for path in template_paths:
+        template = cv2.imread(path)
+        if scale != 1.0:
+            interpolation = cv2.INTER_AREA if scale < 1.0 else cv2.INTER_LINEAR
+            template = cv2.resize(template, None, fx=scale, fy=scale, interpolation=interpolation)
+        h, w = template.shape[:2]
+        truth[path] = []
+        for _ in range(copies):
+            for _ in range(100):
+                x = int(rng.integers(0, width - w))
+                y = int(rng.integers(0, height - h))
+                if all(x + w <= ox or ox + ow <= x or y + h <= oy or oy + oh <= y for ox, oy, ow, oh in occupied):
+                    break
+            occupied.append((x, y, w, h))
+            frame[y:y + h, x:x + w] = template
+            truth[path].append((x + w // 2, y + h // 2))
+    if noise > 0:
+        noisy = frame.astype(np.float32) + rng.normal(0, noise, frame.shape).astype(np.float32)
+        frame = np.clip(noisy, 0, 255).astype(np.uint8)
+    return frame, truth
+
+
+def synthesize_screen(template_paths: List[str], size: Tuple[int, int] = (2560, 1440), seed: int = 0,
+                      scale: float = 1.0, noise: float = 0.0) -> Tuple[np.ndarray, Dict[str, Tuple[int, int]]]:
+    """将模板贴到平滑噪声背景的随机位置，返回画面及各模板中心点"""
+    frame, truth = synthesize_instances(template_paths, size, seed, scale, noise)
+    return frame, {path: centers[0] for path, centers in truth.items()}
+
+
+def near(position: Optional[Tuple[int, int]], target: Tuple[int, int], tolerance: int = 2) -> bool:
+    """检测位置与真实中心点的距离是否在容差内"""
+    return position is not None and abs(position[0] - target[0]) <= tolerance and abs(position[1] - target[1]) <= tolerance
+
+
+def time_call(func: Callable, repeat: int) -> float:
+    """多次调用取耗时中位数(毫秒)"""
+    samples = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        func()
+        samples.append((time.perf_counter() - start) * 1000)
+    return statistics.median(samples)
+
+
+def bench_pyramid(args) -> dict:
+    """比较穷举匹配与金字塔匹配的耗时和命中率"""
+    templates = list_templates(args.click_dir)
+    modes = {'exhaustive': 0, 'pyramid': args.levels}
+    rows = {name: {'latency_ms': [], 'hits': 0} for name in modes}
+    for seed in range(args.screens):
+        frame, truth = synthesize_screen(templates, (args.width, args.height), seed)
+        # 不使用区域记忆，每次都完整搜索
+        matcher = ImageMatcher(ReplayScreenSource([frame]), roi_memory=False, change_gate=False)
+        for path, center in truth.items():
+            for name, levels in modes.items():
+                rows[name]['latency_ms'].append(
+                    time_call(lambda: matcher.find_template(path, args.threshold, pyramid=levels), args.repeat))
+                position = matcher.find_template(path, args.threshold, pyramid=levels)
+                if near(position, center):
+                    rows[name]['hits'] += 1
+
+    total = len(templates) * args.screens
+    report = {}
+    for name, row in rows.items():
+        report[name] = {
+            'median_ms': round(statistics.median(row['latency_ms']), 3),
+            'mean_ms': round(statistics.mean(row['latency_ms']), 3),
+            'accuracy': round(row['hits'] / total, 4),
+        }
+    return report
+
+
+def synthetic_workflow(template_path: str, steps: int) -> List[dict]:
+    """生成包含查找、条件、序列和循环的合成流程，每个顶层动作计一步"""
+    find = {'type': ActionType.FIND, 'params': {'template_path': template_path, 'threshold': 0.9}}
+    kinds = [
+        find,
+        {'type': ActionType.CONDITION, 'params': {'template_path': template_path, 'true_actions': [find], 'false_actions': []}},
+        {'type': ActionType.SEQUENCE, 'params': {'actions': [find]}},
+        {'type': ActionType.LOOP, 'params': {'count': 2, 'actions': [find]}},
+    ]
+    return [kinds[i % len(kinds)] for i in range(steps)]
+
+
+def bench_interpreter(args) -> dict:
+    """测量解释器每个动作的分派开销，以及使用回放画面的完整执行耗时"""
+    rng = np.random.default_rng(0)
+    frame = rng.integers(0, 256, (64, 64, 3), dtype=np.uint8)
+    with tempfile.TemporaryDirectory() as tmp:
+        template_path = os.path.join(tmp, 'template.png')
+        cv2.imwrite(template_path, frame[8:24, 8:24])
+        workflow = synthetic_workflow(template_path, args.steps)
+
+        # 空处理函数：只测编译与分派本身
+        noop = lambda params: None
+        handlers = {action_type: noop for action_type in (ActionType.CLICK, ActionType.FIND, ActionType.WAIT)}
+        conditions = {ActionType.CONDITION: lambda params: True}
+        start = time.perf_counter()
+        program = Compiler(handlers, conditions).compile(workflow)
+        compile_ms = (time.perf_counter() - start) * 1000
+        interpreter = Interpreter(threading.Event(), lambda message, level: None)
+        dispatch_ms = time_call(lambda: interpreter.run(program), args.repeat)
+
+        # 完整执行：回放画面上的真实匹配
+        engine = AutomationEngine(workflow, ReplayScreenSource([frame]))
+        start = time.perf_counter()
+        engine.run()
+        full_ms = (time.perf_counter() - start) * 1000
+
+    return {
+        'interpreter': {
+            'steps': args.steps,
+            'instructions': len(program.code),
+            'compile_ms': round(compile_ms, 3),
+            'dispatch_ms': round(dispatch_ms, 3),
+            'dispatch_us_per_step': round(dispatch_ms * 1000 / args.steps, 3),
+        },
+        'full_run': {
+            'total_ms': round(full_ms, 3),
+            'us_per_step': round(full_ms * 1000 / args.steps, 3),
+        },
+    }
+
+
+def bench_modes(args) -> dict:
+    """比较各颜色模式的单模板匹配耗时和命中率，画面转换计入每帧第一次匹配"""
+    templates = list_templates(args.click_dir)
+    rows = {mode: {'latency_ms': [], 'hits': 0} for mode in args.modes}
+    for seed in range(args.screens):
+        frame, truth = synthesize_screen(templates, (args.width, args.height), seed)
+        for mode in args.modes:
+            # 每个模式使用新的匹配器，避免区域记忆和转换缓存跨模式生效
+            matcher = ImageMatcher(ReplayScreenSource([frame]), roi_memory=False, change_gate=False)
+            for path, center in truth.items():
+                rows[mode]['latency_ms'].append(
+                    time_call(lambda: matcher.find_template(path, args.threshold, color_mode=mode), args.repeat))
+                position = matcher.find_template(path, args.threshold, color_mode=mode)
+                if near(position, center):
+                    rows[mode]['hits'] += 1
+
+    total = len(templates) * args.screens
+    baseline = statistics.median(rows[args.modes[0]]['latency_ms'])
+    report = {}
+    for mode, row in rows.items():
+        median = statistics.median(row['latency_ms'])
+        report[mode] = {
+            'median_ms': round(median, 3),
+            'mean_ms': round(statistics.mean(row['latency_ms']), 3),
+            'speedup': round(baseline / median, 2) if median else None,
+            'accuracy': round(row['hits'] / total, 4),
+        }
+    return report
+
+
+def bench_backends(args) -> dict:
+    """比较串行、线程池和进程池三种方式一次匹配全部模板的耗时"""
+    templates = list_templates(args.click_dir)
+    scales = ImageMatcher.DEFAULT_SCALES if args.multi_scale else None
+    runs = {
+        'serial': (BACKEND_THREAD, False),
+        'thread': (BACKEND_THREAD, True),
+        'process': (BACKEND_PROCESS, True),
+    }
+    rows = {name: {'latency_ms': [], 'single_ms': [], 'hits': 0} for name in runs}
+    if 'process' in runs:
+        # 进程池常驻，启动开销不计入匹配耗时
+        from process_backend import get_process_backend
+        start = time.perf_counter()
+        get_process_backend().warm()
+        warm_ms = (time.perf_counter() - start) * 1000
+    for seed in range(args.screens):
+        frame, truth = synthesize_screen(templates, (args.width, args.height), seed)
+        for name, (backend, parallel) in runs.items():
+            # 不使用区域记忆，每次都完整搜索
+            matcher = ImageMatcher(ReplayScreenSource([frame]), roi_memory=False, backend=backend, change_gate=False)
+            search = lambda: matcher.find_each(templates, args.threshold, parallel=parallel, scales=scales)
+            search()  # 预热模板缓存
+            rows[name]['latency_ms'].append(time_call(search, args.repeat))
+            # 单个模板的整幅搜索：进程后端按行分段或按缩放比例分发，每次先清除学习到的比例
+            single = lambda: (matcher.forget_hits(), matcher.find_template(templates[0], args.threshold, scales=scales))
+            rows[name]['single_ms'].append(time_call(single, args.repeat))
+            for path, result in search().items():
+                if near(result.position, truth[path]):
+                    rows[name]['hits'] += 1
+
+    total = len(templates) * args.screens
+    baseline = statistics.median(rows['serial']['latency_ms'])
+    report = {}
+    for name, row in rows.items():
+        median = statistics.median(row['latency_ms'])
+        report[name] = {
+            'median_ms': round(median, 3),
+            'speedup': round(baseline / median, 2) if median else None,
+            'single_template_ms': round(statistics.median(row['single_ms']), 3),
+            'accuracy': round(row['hits'] / total, 4),
+        }
+    report['process']['warm_ms'] = round(warm_ms, 1)
+    report['process']['workers'] = get_process_backend().max_workers
+    return report
+
+
+def bench_gate(args) -> dict:
+    """模拟轮询：画面静止时比较有无变化检测的单次轮询耗时，最后一帧出现变化以验证不会漏检"""
+    templates = list_templates(args.click_dir)
+    frame, truth = synthesize_screen(templates, (args.width, args.height), 0)
+    changed = frame.copy()
+    # 最后一帧把第一个模板所在位置涂黑
+    x, y = truth[templates[0]]
+    changed[y - 4:y + 4, x - 4:x + 4] = 0
+    report = {}
+    for name, gate in (('no_gate', False), ('gate', True)):
+        # 每次轮询返回内容相同的新画面，与实际截屏一致
+        frames = [frame.copy() for _ in range(args.polls - 1)] + [changed]
+        matcher = ImageMatcher(ReplayScreenSource(frames), roi_memory=False, change_gate=gate)
+        samples = []
+        scores = []
+        for _ in range(args.polls):
+            start = time.perf_counter()
+            result = matcher.find_each(templates[:1], args.threshold)[templates[0]]
+            samples.append((time.perf_counter() - start) * 1000)
+            scores.append(result.score)
+        stats = matcher.stats()
+        report[name] = {
+            'median_ms': round(statistics.median(samples), 3),
+            'skipped': stats['gate_skips'],
+            'checks': stats['gate_checks'],
+            'last_score_changed': scores[-1] != scores[0],
+        }
+    return report
+
+
+def scenario_name(scale: float, noise: float) -> str:
+    return f"scale{scale:g}_noise{noise:g}"
+
+
+def bench_find_template(matcher: ImageMatcher, truth: Dict[str, List[Tuple[int, int]]], threshold: float,
+                        repeat: int, scales, tolerance: int) -> dict:
+    """单模板查找的耗时、吞吐量和命中率"""
+    latencies = []
+    hits = 0
+    for path, centers in truth.items():
+        latencies.append(time_call(lambda: matcher.find_template(path, threshold, scales=scales), repeat))
+        # 画面中有多个副本时命中任意一个即可
+        position = matcher.find_template(path, threshold, scales=scales)
+        if any(near(position, center, tolerance) for center in centers):
+            hits += 1
+    median = statistics.median(latencies)
+    return {
+        'median_ms': round(median, 3),
+        'p90_ms': round(float(np.percentile(latencies, 90)), 3),
+        'throughput_per_s': round(1000 / median, 2) if median else None,
+        'accuracy': round(hits / len(truth), 4),
+    }
+
+
+def bench_find_all(matcher: ImageMatcher, truth: Dict[str, List[Tuple[int, int]]], threshold: float,
+                   repeat: int, scales, tolerance: int) -> dict:
+    """多目标查找的耗时、召回率和准确率"""
+    latencies = []
+    expected = found = returned = 0
+    for path, centers in truth.items():
+        latencies.append(time_call(lambda: matcher.find_all_templates(path, threshold, scales=scales), repeat))
+        positions = [match.position for match in matcher.find_all_templates(path, threshold, scales=scales)]
+        expected += len(centers)
+        returned += len(positions)
+        found += sum(1 for center in centers if any(near(position, center, tolerance) for position in positions))
+    return {
+        'median_ms': round(statistics.median(latencies), 3),
+        'recall': round(found / expected, 4) if expected else None,
+        'precision': round(found / returned, 4) if returned else None,
+    }
+
+
+def bench_workflow(frame: np.ndarray, truth: Dict[str, List[Tuple[int, int]]], threshold: float, loops: int,
+                   multi_scale: bool, tolerance: int) -> dict:
+    """完整流程：依次点击每个模板并循环 loops 次，点击由回调记录而不操作鼠标"""
+    click = lambda path: {'type': ActionType.CLICK,
+                          'params': {'template_path': path, 'threshold': threshold, 'multi_scale': multi_scale}}
+    workflow = [{'type': ActionType.LOOP, 'params': {'count': loops, 'actions': [click(path) for path in truth]}}]
+    clicks: List[Tuple[int, int]] = []
+    engine = AutomationEngine(workflow, ReplayScreenSource([frame], loop=True),
+                              input_driver=lambda x, y: clicks.append((x, y)))
+    start = time.perf_counter()
+    engine.run()
+    elapsed = time.perf_counter() - start
+    targets = list(truth.values()) * loops
+    hits = sum(1 for position, centers in zip(clicks, targets)
+               if any(near(position, center, tolerance) for center in centers))
+    steps = len(targets)
+    return {
+        'steps': steps,
+        'total_ms': round(elapsed * 1000, 3),
+        'ms_per_step': round(elapsed * 1000 / steps, 3),
+        'steps_per_s': round(steps / elapsed, 2) if elapsed else None,
+        'accuracy': round(hits / steps, 4),
+        'gate_skips': engine.matcher.stats()['gate_skips'],
+    }
+
+
+def bench_suite(args) -> dict:
+    """在不同缩放比例和噪声水平的合成画面上测量查找、多目标查找和完整流程"""
+    templates = list_templates(args.click_dir)
+    scenarios = {}
+    for scale in args.scales:
+        for noise in args.noise:
+            multi_scale = scale != 1.0
+            scales = ImageMatcher.DEFAULT_SCALES if multi_scale else None
+            tolerance = max(2, int(round(2 * scale)))
+            frame, truth = synthesize_instances(templates, (args.width, args.height), args.seed, scale, noise,
+                                                copies=args.copies)
+            # 查找耗时测的是完整搜索，关闭区域记忆和变化检测
+            fresh = lambda: ImageMatcher(ReplayScreenSource([frame]), roi_memory=False, change_gate=False)
+            scenarios[scenario_name(scale, noise)] = {
+                'find_template': bench_find_template(fresh(), truth, args.threshold, args.repeat, scales, tolerance),
+                'find_all_templates': bench_find_all(fresh(), truth, args.threshold, args.repeat, scales, tolerance),
+                'workflow': bench_workflow(frame, truth, args.threshold, args.loops, multi_scale, tolerance),
+            }
+    return {
+        'meta': {
+            'time': time.strftime('%Y-%m-%dT%H:%M:%S'),
+            'python': platform.python_version(),
+            'opencv': cv2.__version__,
+            'numpy': np.__version__,
+            'machine': platform.machine(),
+            'cpu_count': os.cpu_count(),
+            'size': [args.width, args.height],
+            'templates': len(templates),
+        },
+        'scenarios': scenarios,
+    }
+
+
+# 比较时各指标的方向：越小越好的为耗时，越大越好的为吞吐量和准确率
+LOWER_IS_BETTER = ('median_ms', 'p90_ms', 'total_ms', 'ms_per_step')
+HIGHER_IS_BETTER = ('throughput_per_s', 'steps_per_s', 'accuracy', 'recall', 'precision')
+
+
+def compare_reports(base: dict, new: dict, tolerance: float) -> dict:
+    """逐项比较两次 suite 结果，耗时变慢超过 tolerance 或准确率下降记为退化"""
+    rows = {}
+    regressions = 0
+    for scenario, groups in new.get('scenarios', {}).items():
+        for group, metrics in groups.items():
+            old_metrics = base.get('scenarios', {}).get(scenario, {}).get(group)
+            if not old_metrics:
+                continue
+            for metric, value in metrics.items():
+                old = old_metrics.get(metric)
+                if not isinstance(value, (int, float)) or not isinstance(old, (int, float)) or old == 0:
+                    continue
+                change = (value - old) / old
+                if metric in LOWER_IS_BETTER:
+                    regressed = change > tolerance
+                elif metric in HIGHER_IS_BETTER:
+                    # 准确率类指标不允许下降，吞吐量按容差判断
+                    limit = 0.0 if metric in ('accuracy', 'recall', 'precision') else tolerance
+                    regressed = change < -limit
+                else:
+                    continue
+                regressions += regressed
+                rows[f"{scenario}.{group}.{metric}"] = {
+                    'base': old,
+                    'new': value,
+                    'change': f"{change:+.1%}",
+                    'regressed': regressed,
+                }
+    return {'regressions': regressions, 'metrics': rows}
+
+
+def bench_compare(args) -> dict:
+    with open(args.base, encoding='utf-8') as f:
+        base = json.load(f)
+    with open(args.new, encoding='utf-8') as f:
+        new = json.load(f)
+    return compare_reports(base, new, args.tolerance)
+
+
+IMPORT_PROBE = """
+import json, time
+start = time.perf_counter()
+{statement}
+elapsed = time.perf_counter() - start
+rss_kb = None
+try:
+    # ru_maxrss 在Linux下会继承父进程的峰值，优先读取 VmHWM
+    with open('/proc/self/status') as f:
+        rss_kb = next(int(line.split()[1]) for line in f if line.startswith('VmHWM:'))
+except (OSError, StopIteration):
+    try:
+        import resource
+        rss_kb = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    except ImportError:
+        pass
+print(json.dumps({{'import_ms': elapsed * 1000, 'max_rss_kb': rss_kb}}))
+"""
+
+
+def bench_imports(args) -> dict:
+    """在独立进程中测量各模块的冷启动导入耗时和峰值内存"""
+    src_dir = os.path.dirname(os.path.abspath(__file__))
+    statements = {'python': 'pass'}
+    statements.update({module: f'import {module}' for module in args.modules})
+    report = {}
+    for name, statement in statements.items():
+        samples = []
+        for _ in range(args.repeat):
+            output = subprocess.run([sys.executable, '-c', IMPORT_PROBE.format(statement=statement)],
+                                    cwd=src_dir, capture_output=True, text=True, check=True).stdout
+            samples.append(json.loads(output))
+        report[name] = {
+            'import_ms': round(statistics.median(sample['import_ms'] for sample in samples), 1),
+            'max_rss_kb': samples[-1]['max_rss_kb'],
+        }
+    return report
+
+
+def common_options(width: int = 2560, height: int = 1440) -> argparse.ArgumentParser:
+    """合成画面类基准共用的模板目录、画面尺寸和阈值参数，每次新建，子命令可使用不同的默认尺寸"""
+    common = argparse.ArgumentParser(add_help=False)
+    common.add_argument('--click-dir', default=DEFAULT_CLICK_DIR)
+    common.add_argument('--width', type=int, default=width)
+    common.add_argument('--height', type=int, default=height)
+    common.add_argument('--threshold', type=float, default=0.8)
+    return common
+
+
+def main(argv=None) -> int:
+    parser = argparse.ArgumentParser(description="图像匹配离线基准")
+    parser.add_argument('--json', action='store_true', help="以JSON格式输出结果")
+    subparsers = parser.add_subparsers(dest='command', required=True)
+
+    pyramid = subparsers.add_parser('pyramid', parents=[common_options()], help="穷举匹配与金字塔匹配对比")
+    pyramid.add_argument('--screens', type=int, default=3)
+    pyramid.add_argument('--repeat', type=int, default=5)
+    pyramid.add_argument('--levels', type=int, default=ImageMatcher.DEFAULT_PYRAMID_LEVELS)
+    pyramid.set_defaults(func=bench_pyramid)
+
+    interpreter = subparsers.add_parser('interpreter', help="解释器分派开销")
+    interpreter.add_argument('--steps', type=int, default=10000)
+    interpreter.add_argument('--repeat', type=int, default=5)
+    interpreter.set_defaults(func=bench_interpreter)
+
+    modes = subparsers.add_parser('modes', parents=[common_options()], help="各颜色模式的匹配耗时")
+    modes.add_argument('--screens', type=int, default=3)
+    modes.add_argument('--repeat', type=int, default=5)
+    modes.add_argument('--modes', nargs='+', choices=ColorMode.ALL, default=list(ColorMode.ALL))
+    modes.set_defaults(func=bench_modes)
+
+    backends = subparsers.add_parser('backends', parents=[common_options()], help="串行、线程池与进程池匹配对比")
+    backends.add_argument('--screens', type=int, default=2)
+    backends.add_argument('--repeat', type=int, default=3)
+    backends.add_argument('--multi-scale', action='store_true', help="同时搜索默认的多个缩放比例")
+    backends.set_defaults(func=bench_backends)
+
+    gate = subparsers.add_parser('gate', parents=[common_options()], help="静止画面轮询时变化检测的效果")
+    gate.add_argument('--polls', type=int, default=20)
+    gate.set_defaults(func=bench_gate)
+
+    suite = subparsers.add_parser('suite', parents=[common_options(1920, 1080)], help="合成画面上的查找、多目标查找和完整流程基准")
+    suite.add_argument('--scales', type=float, nargs='+', default=[1.0, 1.5])
+    suite.add_argument('--noise', type=float, nargs='+', default=[0.0, 8.0])
+    suite.add_argument('--copies', type=int, default=3, help="每个模板在画面中的副本数")
+    suite.add_argument('--loops', type=int, default=3, help="完整流程的循环次数")
+    suite.add_argument('--repeat', type=int, default=3)
+    suite.add_argument('--seed', type=int, default=0)
+    suite.add_argument('--output', help="将结果写入JSON文件")
+    suite.set_defaults(func=bench_suite)
+
+    compare = subparsers.add_parser('compare', help="比较两次 suite 结果，出现退化时退出码为1")
+    compare.add_argument('base')
+    compare.add_argument('new')
+    compare.add_argument('--tolerance', type=float, default=0.1, help="耗时和吞吐量允许的相对变化")
+    compare.set_defaults(func=bench_compare)
+
+    imports = subparsers.add_parser('imports', help="模块冷启动导入耗时与内存")
+    imports.add_argument('--modules', nargs='+', default=['engine', 'automation'])
+    imports.add_argument('--repeat', type=int, default=5)
+    imports.set_defaults(func=bench_imports)
+
+    args = parser.parse_args(argv)
+    report = args.func(args)
+    if getattr(args, 'output', None):
+        with open(args.output, 'w', encoding='utf-8') as f:
+            json.dump(report, f, ensure_ascii=False, indent=2)
+    if args.json:
+        json.dump(report, sys.stdout, ensure_ascii=False, indent=2)
+        print()
+    elif args.command == 'suite':
+        for scenario, groups in report['scenarios'].items():
+            for group, row in groups.items():
+                print(f"{scenario:<20} {group:<20} " + "  ".join(f"{key}={value}" for key, value in row.items()))
+    elif args.command == 'compare':
+        for name, row in report['metrics'].items():
+            mark = "  <-- 退化" if row['regressed'] else ""
+            print(f"{name:<60} {row['base']} -> {row['new']} ({row['change']}){mark}")
+        print(f"退化指标: {report['regressions']}")
+    else:
+        for name, row in report.items():
+            print(f"{name:<12} " + "  ".join(f"{key}={value}" for key, value in row.items()))
+    if args.command == 'compare' and report['regressions']:
+        return 1
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,162 @@
+"""动作模板目录索引
+
+为模板目录维护一个持久化的索引(名称、修改时间、文件大小、动作数、引用的图像路径)，
+列表和搜索直接使用内存中的索引，不再每次列出目录或解析模板文件。
+scan 只重新解析修改时间或大小变化的文件，可在后台线程中调用。
+索引保存在模板目录旁的 <目录名>.index.json，不会被当作模板列出。
+"""
+import os
+import json
+import threading
+from typing import Any, Dict, Iterable, List, NamedTuple, Optional, Tuple
+
+INDEX_VERSION = 1
+TEMPLATE_SUFFIX = '.json'
+
+
+class CatalogEntry(NamedTuple):
+    """索引中的一个动作模板"""
+    name: str
+    mtime_ns: int
+    size: int
+    action_count: int
+    image_paths: Tuple[str, ...]
+    description: str = ""
+
+
+def summarize(items: Iterable[Dict[str, Any]]) -> Tuple[int, Tuple[str, ...]]:
+    """统计动作字典列表(含嵌套子动作)的动作数和引用的图像路径"""
+    count = 0
+    paths: Dict[str, None] = {}
+    stack = list(items)
+    while stack:
+        item = stack.pop()
+        count += 1
+        params = item.get('params', {})
+        if 'template_path' in params:
+            paths[params['template_path']] = None
+        paths.update(dict.fromkeys(params.get('template_paths', [])))
+        for key in ('actions', 'true_actions', 'false_actions'):
+            stack.extend(params.get(key, []))
+        for branch in params.get('branches', {}).values():
+            stack.extend(branch)
+    return count, tuple(paths)
+
+
+class TemplateCatalog:
+    """线程安全的动作模板索引"""
+    def __init__(self, template_dir: str, index_path: Optional[str] = None):
+        self.template_dir = template_dir
+        directory = os.path.normpath(os.path.abspath(template_dir))
+        self.index_path = index_path or directory + '.index.json'
+        self._entries: Dict[str, CatalogEntry] = {}
+        self._lock = threading.Lock()
+        self._scan_lock = threading.Lock()
+        self._save_lock = threading.Lock()
+        self.load()
+
+    def load(self):
+        """读取持久化的索引，索引不存在或已损坏时从空索引开始"""
+        try:
+            with open(self.index_path, 'r', encoding='utf-8') as f:
+                data = json.load(f)
+            if data.get('version') != INDEX_VERSION:
+                return
+            entries = {item[0]: CatalogEntry(item[0], item[1], item[2], item[3], tuple(item[4]), item[5])
+                       for item in data['templates']}
+        except (OSError, ValueError, KeyError, IndexError, TypeError):
+            return
+        with self._lock:
+            self._entries = entries
+
+    def save(self):
+        """写入索引，先写临时文件再替换，避免中途退出留下半个文件"""
+        with self._save_lock:
+            with self._lock:
+                items = [list(entry) for entry in self._entries.values()]
+            tmp_path = self.index_path + '.tmp'
+            with open(tmp_path, 'w', encoding='utf-8') as f:
+                json.dump({'version': INDEX_VERSION, 'templates': items}, f, ensure_ascii=False)
+            os.replace(tmp_path, self.index_path)
+
+    def _file_path(self, name: str) -> str:
+        return os.path.join(self.template_dir, name + TEMPLATE_SUFFIX)
+
+    def _read_entry(self, name: str, stat: os.stat_result) -> Optional[CatalogEntry]:
+        try:
+            with open(self._file_path(name), 'r', encoding='utf-8') as f:
+                data = json.load(f)
+            count, paths = summarize(data['actions'])
+        except (OSError, ValueError, KeyError, AttributeError, TypeError):
+            # 无法解析的文件不列出，修改后下次扫描重新读取
+            return None
+        return CatalogEntry(name, stat.st_mtime_ns, stat.st_size, count, paths, data.get('description', ''))
+
+    def scan(self) -> bool:
+        """按修改时间和大小增量更新索引，有变化时保存并返回True"""
+        with self._scan_lock:
+            # 先取索引快照再列目录，扫描期间新保存的模板不会被误判为已删除
+            with self._lock:
+                current = dict(self._entries)
+            try:
+                files = {entry.name[:-len(TEMPLATE_SUFFIX)]: entry.stat()
+                         for entry in os.scandir(self.template_dir)
+                         if entry.is_file() and entry.name.endswith(TEMPLATE_SUFFIX)}
+            except OSError:
+                files = {}
+            changed = {}
+            for name, stat in files.items():
+                entry = current.get(name)
+                if entry is not None and entry.mtime_ns == stat.st_mtime_ns and entry.size == stat.st_size:
+                    continue
+                changed[name] = self._read_entry(name, stat)
+            removed = [name for name in current if name not in files]
+            if not changed and not removed:
+                return False
+            with self._lock:
+                for name in removed:
+                    self._entries.pop(name, None)
+                for name, entry in changed.items():
+                    if entry is None:
+                        self._entries.pop(name, None)
+                    else:
+                        self._entries[name] = entry
+            self.save()
+            return True
+
+    def update(self, name: str, items: List[Dict[str, Any]], description: str = ""):
+        """模板文件写入后直接更新对应条目，不必等待下次扫描"""
+        stat = os.stat(self._file_path(name))
+        count, paths = summarize(items)
+        with self._lock:
+            self._entries[name] = CatalogEntry(name, stat.st_mtime_ns, stat.st_size, count, paths, description)
+        self.save()
+
+    def remove(self, name: str):
+        with self._lock:
+            self._entries.pop(name, None)
+        self.save()
+
+    def get(self, name: str) -> Optional[CatalogEntry]:
+        with self._lock:
+            return self._entries.get(name)
+
+    def names(self) -> List[str]:
+        """按名称排序的全部模板名称"""
+        with self._lock:
+            return sorted(self._entries)
+
+    def search(self, text: str = "") -> List[CatalogEntry]:
+        """按名称、描述或引用的图像路径筛选，不区分大小写"""
+        text = text.strip().lower()
+        with self._lock:
+            entries = sorted(self._entries.values())
+        if not text:
+            return entries
+        return [entry for entry in entries
+                if text in entry.name.lower() or text in entry.description.lower()
+                or any(text in path.lower() for path in entry.image_paths)]
+
+    def __len__(self) -> int:
+        with self._lock:
+            return len(self._entries)
@@ -0,0 +1,131 @@
+"""命令行执行器
+
+不启动图形界面直接执行 save_workflow 保存的流程，进度以JSON行输出到标准输出：
+
+    python -m cli workflow.json
+    python -m cli workflow.json --screen frames/ --dry-run
+    python -m cli workflow.json --trace run.trace.json
+
+流程文件边读边执行，大流程不必等待整个文件解析完成；流程包一次性载入。
+退出码：0 成功，1 执行中出现错误(包括执行过程中读到的格式错误)，2 流程文件无法读取。
+"""
+import sys
+import json
+import time
+import signal
+import logging
+import argparse
+from typing import Optional
+from engine import AutomationEngine, EngineObserver, MATCH_BACKENDS
+from log_sink import LEVELS, create_file_logger
+from tracing import Tracer
+from pack import is_container
+from workflow_io import WorkflowStream, read_workflow
+
+
+class JsonLinesReporter(EngineObserver):
+    """将执行事件逐行输出为JSON"""
+    def __init__(self, stream=None, quiet: bool = False, file_logger=None):
+        self.stream = stream or sys.stdout
+        self.quiet = quiet
+        self.file_logger = file_logger
+        self.errors = 0
+
+    def emit(self, event: str, **fields):
+        record = {'event': event, 'time': round(time.time(), 3)}
+        record.update(fields)
+        self.stream.write(json.dumps(record, ensure_ascii=False) + "\n")
+        self.stream.flush()
+
+    def on_log(self, message: str, level: str = "info"):
+        if level == "error":
+            self.errors += 1
+        if self.file_logger is not None:
+            self.file_logger.log(LEVELS.get(level, logging.INFO), message)
+        if not self.quiet or level in ("error", "warning"):
+            self.emit('log', level=level, message=message)
+
+    def on_progress(self, value: int):
+        if not self.quiet:
+            self.emit('progress', value=value)
+
+
+def build_parser() -> argparse.ArgumentParser:
+    parser = argparse.ArgumentParser(prog="cli", description="无界面执行自动化流程")
+    parser.add_argument('workflow', help="流程JSON文件或流程包")
+    parser.add_argument('--screen', help="从PNG文件或目录回放画面，代替实际截屏")
+    parser.add_argument('--loop-screen', action='store_true', help="回放画面到末尾后从头开始")
+    parser.add_argument('--dry-run', action='store_true', help="只记录点击位置，不操作鼠标")
+    parser.add_argument('--quiet', action='store_true', help="只输出警告、错误和最终结果")
+    parser.add_argument('--log-file', help="同时将全部日志写入按大小轮转的文件")
+    parser.add_argument('--trace', help="将各步骤耗时写入追踪文件，.jsonl 为JSON行，其他为Chrome追踪格式")
+    parser.add_argument('--backend', choices=MATCH_BACKENDS, help="匹配的执行方式，默认使用流程文件中的设置")
+    parser.add_argument('--template-store', action='append', default=[],
+                        help="挂载模板库，库中模板直接从内存映射读取，可重复指定")
+    return parser
+
+
+def main(argv: Optional[list] = None) -> int:
+    args = build_parser().parse_args(argv)
+    file_logger = create_file_logger(args.log_file) if args.log_file else None
+    reporter = JsonLinesReporter(quiet=args.quiet, file_logger=file_logger)
+
+    try:
+        # 先挂载模板库，流程验证时库中模板视为存在
+        if args.template_store:
+            from template_store import TemplateStore, attach
+            for store_path in args.template_store:
+                attach(TemplateStore(store_path))
+        if is_container(args.workflow):
+            actions, settings = read_workflow(args.workflow)
+        else:
+            actions = WorkflowStream(args.workflow)
+            settings = actions.settings
+    except (OSError, ValueError, KeyError) as e:
+        reporter.emit('finished', status='invalid', message=f"无法读取流程文件: {e}")
+        return 2
+    try:
+        return run_workflow(args, reporter, actions, settings)
+    finally:
+        # 流式读取时执行完、中途停止或参数无效都要关闭流程文件
+        if isinstance(actions, WorkflowStream):
+            actions.close()
+
+
+def run_workflow(args, reporter: JsonLinesReporter, actions, settings: dict) -> int:
+    """按命令行参数执行已读取的流程，返回退出码"""
+    screen_source = None
+    if args.screen:
+        from screen import FileScreenSource
+        try:
+            screen_source = FileScreenSource(args.screen, loop=args.loop_screen)
+        except (OSError, ValueError) as e:
+            reporter.emit('finished', status='invalid', message=f"画面源无效: {e}")
+            return 2
+    input_driver = None
+    if args.dry_run:
+        input_driver = lambda x, y: reporter.emit('click', x=x, y=y)
+
+    backend = args.backend or settings['match_backend']
+    if backend not in MATCH_BACKENDS:
+        reporter.emit('finished', status='invalid', message=f"不支持的匹配后端: {backend}")
+        return 2
+    tracer = Tracer() if args.trace else None
+    runner = AutomationEngine(actions, screen_source, input_driver, reporter, backend, tracer)
+    # Ctrl+C 请求停止，正在进行的等待会立即中断
+    signal.signal(signal.SIGINT, lambda signum, frame: runner.stop())
+
+    start = time.perf_counter()
+    runner.run()
+    elapsed = time.perf_counter() - start
+    stopped = not runner.running
+    status = 'stopped' if stopped else ('failed' if reporter.errors else 'ok')
+    if tracer is not None:
+        tracer.export(args.trace)
+        reporter.emit('trace', path=args.trace, summary=tracer.summary())
+    reporter.emit('finished', status=status, errors=reporter.errors, elapsed=round(elapsed, 3))
+    return 0 if status == 'ok' else 1
+
+
+if __name__ == '__main__':
+    sys.exit(main())
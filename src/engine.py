@@ -0,0 +1,969 @@
+import time
+import cv2
+import numpy as np
+import logging
+from typing import Callable, Iterable, List, Tuple, Optional, Dict, NamedTuple, Sequence
+from concurrent.futures import ThreadPoolExecutor, Future, wait, FIRST_COMPLETED
+from actions import Action, ActionType, ColorMode
+from interpreter import Compiler, Interpreter, Program
+from template_cache import CachedTemplate, convert_color, template_cache
+from screen import ScreenSource, PyAutoGUIScreenSource, CachedScreenSource, display_scale
+from tracing import (Tracer, NULL_TRACER, CATEGORY_ACTION, CATEGORY_CAPTURE, CATEGORY_CONVERT, CATEGORY_MATCH,
+                     CATEGORY_INPUT, CATEGORY_SLEEP)
+import os
+import zlib
+from collections import OrderedDict
+import operator
+import queue
+import threading
+
+
+class MatchResult(NamedTuple):
+    """单个模板的匹配结果，position 为屏幕坐标中心点，未达到阈值时为None，scale 为模板的缩放比例"""
+    template_path: str
+    position: Optional[Tuple[int, int]]
+    score: float
+    scale: float = 1.0
+
+
+_match_pool: Optional[ThreadPoolExecutor] = None
+
+
+def get_match_pool() -> ThreadPoolExecutor:
+    """获取共享的匹配线程池，OpenCV匹配期间会释放GIL"""
+    global _match_pool
+    if _match_pool is None:
+        _match_pool = ThreadPoolExecutor(max_workers=os.cpu_count() or 4, thread_name_prefix="match")
+    return _match_pool
+
+
+# 并行匹配多个模板的执行方式：thread 使用线程池，process 使用共享内存的进程池
+BACKEND_THREAD = "thread"
+BACKEND_PROCESS = "process"
+MATCH_BACKENDS = (BACKEND_THREAD, BACKEND_PROCESS)
+
+
+class ImageMatcher:
+    def __init__(self, screen_source: Optional[ScreenSource] = None, roi_memory: bool = True, roi_padding: int = 32,
+                 backend: str = BACKEND_THREAD, change_gate: bool = True, tracer: Optional[Tracer] = None):
+        if backend not in MATCH_BACKENDS:
+            raise ValueError(f"不支持的匹配后端: {backend}")
+        # 默认截取实际桌面，并在30毫秒内共享同一帧画面
+        self.screen = screen_source or CachedScreenSource(PyAutoGUIScreenSource())
+        self.backend = backend
+        self.tracer = tracer or NULL_TRACER
+        # 记录每个模板上次命中的屏幕区域 (x, y, 宽, 高)，下次优先在其附近搜索
+        self.roi_memory = roi_memory
+        self.roi_padding = roi_padding
+        self._last_hits: Dict[Tuple[str, str, float, int], Tuple[int, int, int, int]] = {}
+        self._stats_lock = threading.Lock()
+        self.roi_hits = 0
+        self.roi_misses = 0
+        # 同一帧画面按颜色模式只转换一次，所有同模式模板共用
+        self._frame_lock = threading.Lock()
+        self._frame_key: Optional[tuple] = None
+        self._frame_ref: Optional[np.ndarray] = None
+        self._frame_variants: Dict[str, np.ndarray] = {}
+        self.conversions = 0
+        self.conversion_reuses = 0
+        # 多尺度匹配中每个模板及整个会话最近命中的缩放比例，之后优先尝试
+        self._learned_scales: Dict[str, float] = {}
+        self.session_scale: Optional[float] = None
+        self.scale_attempts = 0
+        self.scale_searches = 0
+        # 画面变化检测：搜索区域的校验和与上次相同时直接返回上次的匹配结果
+        self.change_gate = change_gate
+        self._gate_lock = threading.Lock()
+        self._gate_results: 'OrderedDict[tuple, Tuple[tuple, object]]' = OrderedDict()
+        self.gate_checks = 0
+        self.gate_skips = 0
+
+    def capture(self, region: Optional[Tuple[int, int, int, int]] = None) -> np.ndarray:
+        """获取BGR格式的屏幕画面"""
+        with self.tracer.span("capture", CATEGORY_CAPTURE, region=region):
+            return self.screen.grab(region)
+
+    def invalidate(self):
+        """输入事件后丢弃缓存画面"""
+        self.screen.invalidate()
+
+    def _frame_memo(self, screenshot: np.ndarray, name, compute: Callable[[np.ndarray], object]) -> Tuple[object, bool]:
+        """按帧缓存由画面计算出的值，同一帧(含同一裁剪区域)只计算一次，返回 (值, 是否复用)"""
+        # 持有原数组引用，保证数据地址在缓存期间不会被复用
+        key = (screenshot.__array_interface__['data'][0], screenshot.shape, screenshot.strides)
+        with self._frame_lock:
+            if key == self._frame_key:
+                value = self._frame_variants.get(name)
+                if value is not None:
+                    return value, True
+            else:
+                self._frame_key = key
+                self._frame_ref = screenshot
+                self._frame_variants = {}
+        value = compute(screenshot)
+        with self._frame_lock:
+            if key == self._frame_key:
+                self._frame_variants[name] = value
+        return value, False
+
+    def _convert_frame(self, screenshot: np.ndarray, mode: str) -> np.ndarray:
+        """返回画面的指定颜色模式版本，同一帧的转换结果被所有同模式模板复用"""
+        if mode == ColorMode.BGR:
+            return screenshot
+        with self.tracer.span("convert", CATEGORY_CONVERT, mode=mode) as span:
+            converted, reused = self._frame_memo(screenshot, mode, lambda frame: convert_color(frame, mode))
+            span.set(reused=reused)
+        with self._stats_lock:
+            if reused:
+                self.conversion_reuses += 1
+            else:
+                self.conversions += 1
+        return converted
+
+    @staticmethod
+    def _checksum(frame: np.ndarray) -> tuple:
+        """画面内容的校验和，CRC32 对整屏只需几毫秒，远低于一次模板匹配"""
+        return frame.shape, zlib.crc32(np.ascontiguousarray(frame))
+
+    # 变化检测最多保留的结果数，超出时淘汰最久未使用的
+    GATE_MAX_ENTRIES = 256
+
+    def _region_signature(self, screenshot: np.ndarray, region: Optional[Tuple[int, int, int, int]]) -> Tuple[tuple, bool]:
+        """搜索区域的校验和，区域外的变化(时钟、动画、通知)不影响区域限定的动作
+
+        截图通常已按区域截取；传入的是整幅画面时只对区域切片计算，同一帧的每个区域只计算一次。
+        """
+        if region and (screenshot.shape[1] > region[2] or screenshot.shape[0] > region[3]):
+            x, y = max(region[0], 0), max(region[1], 0)
+            return self._frame_memo(screenshot, ('checksum', region),
+                                    lambda frame: self._checksum(frame[y:y + region[3], x:x + region[2]]))
+        return self._frame_memo(screenshot, ('checksum', None), self._checksum)
+
+    def _gate_key(self, *params) -> Optional[tuple]:
+        """变化检测的缓存键，包含模板文件的修改时间，模板被替换后不会返回旧结果"""
+        if template_cache.is_resident(params[1]):
+            # 常驻内存的模板不会变化
+            return params + (None,)
+        try:
+            mtime = os.stat(params[1]).st_mtime_ns
+        except OSError:
+            return None
+        return params + (mtime,)
+
+    def _gate_lookup(self, screenshot: np.ndarray, key: Optional[tuple], region: Optional[Tuple[int, int, int, int]] = None):
+        """搜索区域与上次相同时返回上次的结果，否则返回 (None, 区域校验和)"""
+        if not self.change_gate or key is None:
+            return None, None
+        with self.tracer.span("checksum", CATEGORY_CONVERT) as span:
+            signature, reused = self._region_signature(screenshot, region)
+            span.set(reused=reused)
+        with self._gate_lock:
+            cached = self._gate_results.get(key)
+            if cached is not None:
+                self._gate_results.move_to_end(key)
+        with self._stats_lock:
+            self.gate_checks += 1
+            if cached is not None and cached[0] == signature:
+                self.gate_skips += 1
+                return cached[1], signature
+        return None, signature
+
+    def _gate_store(self, key: Optional[tuple], signature: Optional[tuple], result):
+        if signature is None:
+            return
+        with self._gate_lock:
+            self._gate_results[key] = (signature, result)
+            self._gate_results.move_to_end(key)
+            while len(self._gate_results) > self.GATE_MAX_ENTRIES:
+                self._gate_results.popitem(last=False)
+
+    def clear_gate(self):
+        """清除变化检测保存的全部结果"""
+        with self._gate_lock:
+            self._gate_results.clear()
+
+    # 金字塔匹配参数：默认缩小层数、缩小后模板最短边下限、每层保留的候选峰值数
+    DEFAULT_PYRAMID_LEVELS = 2
+    PYRAMID_MIN_TEMPLATE_SIDE = 12
+    PYRAMID_MAX_CANDIDATES = 3
+    PYRAMID_COARSE_MARGIN = 0.2
+
+    def _locate(self, screenshot: np.ndarray, template: np.ndarray, pyramid: int = 0) -> Tuple[float, Tuple[int, int]]:
+        """返回模板在画面中的最高得分及其左上角坐标"""
+        levels = self.DEFAULT_PYRAMID_LEVELS if pyramid is True else int(pyramid or 0)
+        if levels > 0:
+            return self._locate_pyramid(screenshot, template, levels)
+        result = self._score_map(screenshot, template)
+        min_val, max_val, min_loc, max_loc = cv2.minMaxLoc(result)
+        return max_val, max_loc
+
+    # 进程后端下画面(或搜索区域)不少于此像素数时，整幅搜索的得分图分段在进程池中计算
+    PROCESS_MIN_PIXELS = 640 * 480
+
+    def _score_map(self, screenshot: np.ndarray, template: np.ndarray) -> np.ndarray:
+        """模板在整幅画面上的归一化相关系数得分图"""
+        if self.backend == BACKEND_PROCESS and screenshot.shape[0] * screenshot.shape[1] >= self.PROCESS_MIN_PIXELS:
+            from process_backend import get_process_backend
+            return get_process_backend().score_map(screenshot, template)
+        return cv2.matchTemplate(screenshot, template, cv2.TM_CCOEFF_NORMED)
+
+    def _locate_pyramid(self, screenshot: np.ndarray, template: np.ndarray, levels: int) -> Tuple[float, Tuple[int, int]]:
+        """由粗到精匹配：先在缩小的画面上找候选峰值，再在原分辨率的邻域内精确匹配"""
+        h, w = template.shape[:2]
+        while levels > 0 and min(h, w) >> levels < self.PYRAMID_MIN_TEMPLATE_SIDE:
+            levels -= 1
+        if levels == 0:
+            return self._locate(screenshot, template)
+        factor = 1 << levels
+        screen_h, screen_w = screenshot.shape[:2]
+        small_screen = cv2.resize(screenshot, (screen_w // factor, screen_h // factor), interpolation=cv2.INTER_AREA)
+        small_template = cv2.resize(template, (w // factor, h // factor), interpolation=cv2.INTER_AREA)
+        coarse = cv2.matchTemplate(small_screen, small_template, cv2.TM_CCOEFF_NORMED)
+        small_h, small_w = small_template.shape[:2]
+
+        best_val, best_loc = -1.0, (0, 0)
+        first_peak = None
+        pad = factor * 2
+        for _ in range(self.PYRAMID_MAX_CANDIDATES):
+            _, peak_val, _, peak_loc = cv2.minMaxLoc(coarse)
+            if first_peak is None:
+                first_peak = peak_val
+            elif peak_val < first_peak - self.PYRAMID_COARSE_MARGIN:
+                break
+            # 抑制该峰值附近区域，下一轮取其他候选
+            px, py = peak_loc
+            coarse[max(py - small_h // 2, 0):py + small_h // 2 + 1, max(px - small_w // 2, 0):px + small_w // 2 + 1] = -1.0
+
+            x0 = max(px * factor - pad, 0)
+            y0 = max(py * factor - pad, 0)
+            x1 = min(px * factor + w + pad, screen_w)
+            y1 = min(py * factor + h + pad, screen_h)
+            if x1 - x0 < w or y1 - y0 < h:
+                continue
+            fine = cv2.matchTemplate(screenshot[y0:y1, x0:x1], template, cv2.TM_CCOEFF_NORMED)
+            _, fine_val, _, fine_loc = cv2.minMaxLoc(fine)
+            if fine_val > best_val:
+                best_val, best_loc = fine_val, (fine_loc[0] + x0, fine_loc[1] + y0)
+        return best_val, best_loc
+
+    # 多尺度匹配的默认候选比例，覆盖常见的显示器缩放设置
+    DEFAULT_SCALES = (1.0, 1.25, 1.5, 1.75, 2.0, 0.8, 0.67, 0.5)
+    # 多尺度匹配得分达到此值时不再尝试其他比例
+    SCALE_CONFIDENT_SCORE = 0.95
+
+    @classmethod
+    def default_scales(cls) -> Tuple[float, ...]:
+        """默认候选比例，加入当前显示器的缩放比例"""
+        scale = round(display_scale(), 4)
+        return cls.DEFAULT_SCALES if scale in cls.DEFAULT_SCALES else cls.DEFAULT_SCALES + (scale,)
+
+    def _scale_order(self, template_path: str, scales: Sequence[float]) -> List[float]:
+        """候选比例的尝试顺序：该模板上次命中的比例、会话比例，其余按与显示器缩放比例的接近程度"""
+        reference = display_scale()
+        known = self._known_scales(template_path, scales)
+        # 模板比例与会话比例相同时只保留一次
+        return list(dict.fromkeys(known + sorted(scales, key=lambda s: abs(np.log(s / reference)))))
+
+    def _known_scales(self, template_path: str, scales: Sequence[float]) -> List[float]:
+        """该模板上次命中的比例和会话比例中属于候选比例的部分"""
+        known = (self._learned_scales.get(template_path), self.session_scale)
+        return list(dict.fromkeys(scale for scale in known if scale is not None and scale in scales))
+
+    def learned_scale(self, template_path: str) -> Optional[float]:
+        """返回模板在本次会话中命中的缩放比例"""
+        return self._learned_scales.get(template_path)
+
+    def _match(self, screenshot: np.ndarray, template_path: str, threshold: float, region: Optional[Tuple[int, int, int, int]], pyramid: int = 0, color_mode: str = ColorMode.BGR, scales: Optional[Sequence[float]] = None) -> MatchResult:
+        """在给定画面上匹配单个模板，提供 scales 时按学习到的顺序尝试各缩放比例"""
+        key = self._gate_key('match', template_path, threshold, region, pyramid, color_mode,
+                             tuple(scales) if scales else None)
+        cached, signature = self._gate_lookup(screenshot, key, region)
+        if cached is not None:
+            return cached
+        converted = self._convert_frame(screenshot, color_mode)
+        with self.tracer.span("match", CATEGORY_MATCH, template=template_path) as span:
+            result = self._match_converted(converted, template_path, threshold, region, pyramid, color_mode, scales)
+            span.set(score=round(result.score, 4), scale=result.scale, found=result.position is not None)
+        self._gate_store(key, signature, result)
+        return result
+
+    def _match_converted(self, screenshot: np.ndarray, template_path: str, threshold: float, region: Optional[Tuple[int, int, int, int]], pyramid: int, color_mode: str, scales: Optional[Sequence[float]]) -> MatchResult:
+        """在已转换为 color_mode 的画面上匹配单个模板"""
+        if not scales:
+            return self._match_scale(screenshot, template_path, threshold, region, pyramid, color_mode, 1.0)
+
+        best = MatchResult(template_path, None, 0.0)
+        confident = max(threshold, self.SCALE_CONFIDENT_SCORE)
+        known = self._known_scales(template_path, scales)
+        with self._stats_lock:
+            self.scale_searches += 1
+        ordered = self._scale_order(template_path, scales)
+        for index, scale in enumerate(ordered):
+            if self.backend == BACKEND_PROCESS and index >= max(len(known), 1):
+                # 已知比例(或最接近显示器缩放的比例)未命中，其余比例各作为一个任务同时在进程池中尝试
+                for result in self._match_scales_in_processes(screenshot, template_path, threshold, region,
+                                                              pyramid, color_mode, ordered[index:]):
+                    best = self._better_match(best, result)
+                break
+            with self._stats_lock:
+                self.scale_attempts += 1
+            result = self._match_scale(screenshot, template_path, threshold, region, pyramid, color_mode, scale)
+            best = self._better_match(best, result)
+            # 已知比例达到阈值即采用，未命中时才继续尝试其余比例
+            if result.score >= confident or (scale in known and result.position is not None):
+                break
+        if best.position is not None:
+            self._learned_scales[template_path] = best.scale
+            self.session_scale = best.scale
+        return best
+
+    @staticmethod
+    def _better_match(best: MatchResult, result: MatchResult) -> MatchResult:
+        """达到阈值的结果优先，其次比较得分"""
+        if result.position is not None and (best.position is None or result.score > best.score):
+            return result
+        if best.position is None and result.score > best.score:
+            return result
+        return best
+
+    def _match_scales_in_processes(self, screenshot: np.ndarray, template_path: str, threshold: float, region: Optional[Tuple[int, int, int, int]], pyramid: int, color_mode: str, scales: Sequence[float]) -> List[MatchResult]:
+        """每个缩放比例一个任务在进程池中匹配，命中的比例学习后下次在本进程中直接尝试"""
+        from process_backend import get_process_backend
+        with self._stats_lock:
+            self.scale_attempts += len(scales)
+        with self.tracer.span("match_scales", CATEGORY_MATCH, template=template_path, scales=len(scales)):
+            results = get_process_backend().match_scales(screenshot, template_path, threshold, region, pyramid,
+                                                         color_mode, scales)
+        return results
+
+    def _match_scale(self, screenshot: np.ndarray, template_path: str, threshold: float, region: Optional[Tuple[int, int, int, int]], pyramid: int, color_mode: str, scale: float) -> MatchResult:
+        """在已转换颜色的画面上按单个缩放比例匹配模板，优先搜索上次命中位置附近"""
+        entry = template_cache.get_entry(template_path, color_mode, scale)
+        # 纯色模板的相关系数无定义，视为未找到
+        if entry is None or entry.norm == 0.0:
+            return MatchResult(template_path, None, 0.0, scale)
+        template = entry.image
+        h, w = template.shape[:2]
+        if h > screenshot.shape[0] or w > screenshot.shape[1]:
+            return MatchResult(template_path, None, 0.0, scale)
+        offset_x, offset_y = (region[0], region[1]) if region else (0, 0)
+
+        # 金字塔与穷举搜索分别记忆，互不借用对方的命中
+        hit_key = (template_path, color_mode, scale, pyramid)
+        roi_match = self._match_last_hit(screenshot, entry, hit_key, threshold, offset_x, offset_y)
+        if roi_match is not None:
+            max_val, max_loc = roi_match
+        else:
+            max_val, max_loc = self._locate(screenshot, template, pyramid)
+        if max_val >= threshold:
+            center_x = max_loc[0] + w // 2 + offset_x
+            center_y = max_loc[1] + h // 2 + offset_y
+            if self.roi_memory:
+                self._last_hits[hit_key] = (max_loc[0] + offset_x, max_loc[1] + offset_y, w, h)
+            return MatchResult(template_path, (center_x, center_y), max_val, scale)
+        return MatchResult(template_path, None, max_val, scale)
+
+    # 模板在上次命中的原位得分不低于此值时直接采用，不再搜索邻域
+    ROI_EXACT_SCORE = 0.99
+
+    def _match_last_hit(self, screenshot: np.ndarray, entry: CachedTemplate, hit_key: tuple, threshold: float, offset_x: int, offset_y: int) -> Optional[Tuple[float, Tuple[int, int]]]:
+        """先用预计算的模板统计量检查上次命中的原位，再在外扩 roi_padding 的范围内匹配，
+        未命中返回None以回退到整幅搜索"""
+        if not self.roi_memory:
+            return None
+        last_hit = self._last_hits.get(hit_key)
+        if last_hit is None:
+            return None
+        template = entry.image
+        x, y, w, h = last_hit
+        screen_h, screen_w = screenshot.shape[:2]
+        exact_x, exact_y = x - offset_x, y - offset_y
+        if 0 <= exact_x and 0 <= exact_y and exact_x + w <= screen_w and exact_y + h <= screen_h:
+            score = entry.score_at(screenshot[exact_y:exact_y + h, exact_x:exact_x + w])
+            if score >= max(threshold, self.ROI_EXACT_SCORE):
+                with self._stats_lock:
+                    self.roi_hits += 1
+                return score, (exact_x, exact_y)
+        x0 = max(x - self.roi_padding - offset_x, 0)
+        y0 = max(y - self.roi_padding - offset_y, 0)
+        x1 = min(x + w + self.roi_padding - offset_x, screen_w)
+        y1 = min(y + h + self.roi_padding - offset_y, screen_h)
+        if x1 - x0 < template.shape[1] or y1 - y0 < template.shape[0]:
+            return None
+        result = cv2.matchTemplate(screenshot[y0:y1, x0:x1], template, cv2.TM_CCOEFF_NORMED)
+        _, max_val, _, max_loc = cv2.minMaxLoc(result)
+        hit = max_val >= threshold
+        with self._stats_lock:
+            if hit:
+                self.roi_hits += 1
+            else:
+                self.roi_misses += 1
+        if not hit:
+            return None
+        return max_val, (max_loc[0] + x0, max_loc[1] + y0)
+
+    def forget_hits(self):
+        """清除所有模板的上次命中区域和学习到的缩放比例"""
+        self._last_hits.clear()
+        self._learned_scales.clear()
+        self.session_scale = None
+
+    def stats(self) -> dict:
+        """返回区域记忆命中、画面颜色转换、多尺度尝试及变化检测跳过匹配的统计"""
+        with self._stats_lock:
+            attempts = self.roi_hits + self.roi_misses
+            return {
+                'roi_hits': self.roi_hits,
+                'roi_misses': self.roi_misses,
+                'roi_hit_rate': self.roi_hits / attempts if attempts else 0.0,
+                'frame_conversions': self.conversions,
+                'frame_conversion_reuses': self.conversion_reuses,
+                'session_scale': self.session_scale,
+                'gate_checks': self.gate_checks,
+                'gate_skips': self.gate_skips,
+                'scale_attempts_per_search': self.scale_attempts / self.scale_searches if self.scale_searches else 0.0
+            }
+
+    @staticmethod
+    def _as_region(region) -> Optional[Tuple[int, int, int, int]]:
+        """流程文件中的区域为列表，转换为元组后才能用于变化检测和缓存的键"""
+        return tuple(region) if region else None
+
+    def find_template(self, template_path: str, threshold: float = 0.8, region: Optional[Tuple[int, int, int, int]] = None, pyramid: int = 0, color_mode: str = ColorMode.BGR, scales: Optional[Sequence[float]] = None) -> Optional[Tuple[int, int]]:
+        """在屏幕上查找模板图像，pyramid 为金字塔缩小层数(True 使用默认层数)，color_mode 见 ColorMode，
+        scales 为多尺度匹配的候选缩放比例"""
+        region = self._as_region(region)
+        try:
+            screenshot = self.capture(region)
+            return self._match(screenshot, template_path, threshold, region, pyramid, color_mode, scales).position
+        except Exception as e:
+            logging.error(f"图像匹配错误: {e}")
+            return None
+
+    def find_each(self, template_paths: List[str], threshold: float = 0.8, region: Optional[Tuple[int, int, int, int]] = None, parallel: bool = False, pyramid: int = 0, color_mode: str = ColorMode.BGR, scales: Optional[Sequence[float]] = None) -> Dict[str, MatchResult]:
+        """截屏一次，对同一画面匹配多个模板，返回每个模板的得分和位置
+
+        parallel 时在线程池中匹配；进程后端下多个模板总是按模板分发到进程池。
+        """
+        region = self._as_region(region)
+        try:
+            screenshot = self.capture(region)
+            # 在分发到线程池前转换一次，各模板共用
+            self._convert_frame(screenshot, color_mode)
+            if len(template_paths) > 1 and self.backend == BACKEND_PROCESS:
+                results = self._match_in_processes(screenshot, template_paths, threshold, region, pyramid, color_mode, scales)
+            elif parallel and len(template_paths) > 1:
+                futures = [get_match_pool().submit(self._match, screenshot, path, threshold, region, pyramid, color_mode, scales)
+                           for path in template_paths]
+                results = [future.result() for future in futures]
+            else:
+                results = [self._match(screenshot, path, threshold, region, pyramid, color_mode, scales)
+                           for path in template_paths]
+            return {result.template_path: result for result in results}
+        except Exception as e:
+            logging.error(f"图像匹配错误: {e}")
+            return {}
+
+    def _match_in_processes(self, screenshot: np.ndarray, template_paths: List[str], threshold: float, region: Optional[Tuple[int, int, int, int]], pyramid: int, color_mode: str, scales: Optional[Sequence[float]]) -> List[MatchResult]:
+        """在进程池中匹配，画面经共享内存传递；工作进程不共享区域记忆，命中的缩放比例在此合并"""
+        from process_backend import get_process_backend
+        results: Dict[str, MatchResult] = {}
+        pending = []
+        scales_key = tuple(scales) if scales else None
+        for path in template_paths:
+            key = self._gate_key('match', path, threshold, region, pyramid, color_mode, scales_key)
+            cached, signature = self._gate_lookup(screenshot, key, region)
+            if cached is not None:
+                results[path] = cached
+            else:
+                pending.append((path, key, signature))
+        if pending:
+            converted = self._convert_frame(screenshot, color_mode)
+            ordered_scales = self._scale_order(pending[0][0], scales) if scales else None
+            # 按本进程学习到的顺序下发，工作进程先尝试已知比例
+            with self.tracer.span("match_processes", CATEGORY_MATCH, templates=len(pending)):
+                matched = get_process_backend().match_many(converted, [path for path, _, _ in pending], threshold,
+                                                           region, pyramid, color_mode, ordered_scales)
+            for (path, key, signature), result in zip(pending, matched):
+                self._gate_store(key, signature, result)
+                results[path] = result
+                if scales and result.position is not None:
+                    self._learned_scales[path] = result.scale
+                    self.session_scale = result.scale
+        return [results[path] for path in template_paths]
+
+    def find_any(self, template_paths: List[str], threshold: float = 0.8, region: Optional[Tuple[int, int, int, int]] = None, parallel: bool = False, pyramid: int = 0, color_mode: str = ColorMode.BGR, scales: Optional[Sequence[float]] = None) -> Optional[MatchResult]:
+        """查找多个模板中得分最高且达到阈值的一个，均未找到时返回None"""
+        results = self.find_each(template_paths, threshold, region, parallel, pyramid, color_mode, scales)
+        found = [result for result in results.values() if result.position is not None]
+        if not found:
+            return None
+        return max(found, key=lambda result: result.score)
+
+    def find_all_templates(self, template_path: str, threshold: float = 0.8, region: Optional[Tuple[int, int, int, int]] = None, max_results: Optional[int] = None, color_mode: str = ColorMode.BGR, scales: Optional[Sequence[float]] = None) -> List[MatchResult]:
+        """在屏幕上查找所有匹配的模板图像，每个目标只返回一个中心点，按得分从高到低排序
+
+        提供 scales 时先用多尺度匹配确定缩放比例(已学习过的直接使用)，再在该比例下查找全部目标。
+        """
+        region = self._as_region(region)
+        try:
+            raw = self.capture(region)
+            key = self._gate_key('all', template_path, threshold, region, max_results, color_mode,
+                                 tuple(scales) if scales else None)
+            cached, signature = self._gate_lookup(raw, key, region)
+            if cached is not None:
+                return list(cached)
+            matches = self._find_all(raw, template_path, threshold, region, max_results, color_mode, scales)
+            self._gate_store(key, signature, tuple(matches))
+            return matches
+        except Exception as e:
+            logging.error(f"图像匹配错误: {e}")
+            return []
+
+    def _find_all(self, raw: np.ndarray, template_path: str, threshold: float, region: Optional[Tuple[int, int, int, int]], max_results: Optional[int], color_mode: str, scales: Optional[Sequence[float]]) -> List[MatchResult]:
+        """在画面上查找模板的全部匹配位置"""
+        scale = 1.0
+        if scales:
+            scale = self.learned_scale(template_path)
+            if scale is None:
+                best = self._match(raw, template_path, threshold, region, 0, color_mode, scales)
+                if best.position is None:
+                    return []
+                scale = best.scale
+        screenshot = self._convert_frame(raw, color_mode)
+        entry = template_cache.get_entry(template_path, color_mode, scale)
+        if entry is None or entry.norm == 0.0:
+            return []
+        template = entry.image
+        if template.shape[0] > screenshot.shape[0] or template.shape[1] > screenshot.shape[1]:
+            return []
+        with self.tracer.span("match_all", CATEGORY_MATCH, template=template_path) as span:
+            result = self._score_map(screenshot, template)
+            h, w = template.shape[:2]
+            offset_x, offset_y = (region[0], region[1]) if region else (0, 0)
+            matches = [
+                MatchResult(template_path, (x + w // 2 + offset_x, y + h // 2 + offset_y), score, scale)
+                for x, y, score in self._extract_peaks(result, threshold, w, h, max_results)
+            ]
+            span.set(count=len(matches), scale=scale)
+        return matches
+
+    @staticmethod
+    def _extract_peaks(result: np.ndarray, threshold: float, w: int, h: int, max_results: Optional[int] = None) -> List[Tuple[int, int, float]]:
+        """从匹配得分图中提取峰值并做非极大值抑制
+
+        先用半个模板大小的膨胀核找局部极大值，再按得分贪心抑制中心距离
+        小于半个模板的峰值，保证同一目标只保留一个坐标。
+        """
+        ys, xs = np.nonzero(result >= threshold)
+        if len(xs) == 0:
+            return []
+        # 只在超过阈值的外接矩形内做膨胀
+        pad_x, pad_y = max(w // 2, 1), max(h // 2, 1)
+        x0, y0 = max(xs.min() - pad_x, 0), max(ys.min() - pad_y, 0)
+        x1, y1 = xs.max() + pad_x + 1, ys.max() + pad_y + 1
+        window = result[y0:y1, x0:x1]
+        kernel = np.ones((pad_y | 1, pad_x | 1), np.uint8)
+        peaks = (window >= threshold) & (window >= cv2.dilate(window, kernel))
+        ys, xs = np.nonzero(peaks)
+        scores = window[ys, xs]
+        xs = xs + x0
+        ys = ys + y0
+
+        order = np.argsort(-scores, kind='stable')
+        xs, ys, scores = xs[order], ys[order], scores[order]
+        suppressed = np.zeros(len(xs), dtype=bool)
+        matches = []
+        for i in range(len(xs)):
+            if suppressed[i]:
+                continue
+            matches.append((int(xs[i]), int(ys[i]), float(scores[i])))
+            if max_results and len(matches) >= max_results:
+                break
+            suppressed |= (np.abs(xs - xs[i]) < pad_x) & (np.abs(ys - ys[i]) < pad_y)
+        return matches
+
+    @staticmethod
+    def cache_stats() -> dict:
+        """返回模板缓存统计"""
+        return template_cache.stats()
+
+class EngineObserver:
+    """执行事件观察者，默认实现忽略所有事件
+
+    回调在执行线程中调用，界面层需要自行切换到界面线程。
+    """
+    def on_log(self, message: str, level: str):
+        pass
+
+    def on_progress(self, value: int):
+        pass
+
+    def on_finished(self):
+        pass
+
+
+class AutomationEngine:
+    """不依赖Qt的自动化执行引擎，run 在调用线程中阻塞执行，start 在后台线程执行
+
+    actions 为列表时启动前一次性编译整个流程；为迭代器(如 WorkflowStream)时逐个取出
+    顶层动作编译执行，文件未读完即可开始执行，进度按迭代器的 length_hint 估算。
+    """
+    def __init__(self, actions: Iterable[Action], screen_source: Optional[ScreenSource] = None,
+                 input_driver: Optional[Callable[[int, int], None]] = None,
+                 observer: Optional[EngineObserver] = None, match_backend: str = BACKEND_THREAD,
+                 tracer: Optional[Tracer] = None):
+        self.observer = observer or EngineObserver()
+        self.actions = actions
+        self.running = True
+        self._stop_event = threading.Event()
+        self.current_action_index = 0
+        self.total_actions = len(actions) if isinstance(actions, Sequence) else 0
+        # 提供 tracer 时记录每个动作及其各步骤的耗时
+        self.tracer = tracer or NULL_TRACER
+        self._action_start_ns = 0
+        self.matcher = ImageMatcher(screen_source, backend=match_backend, tracer=self.tracer)
+        # 所有鼠标输入(包括并行子动作)经同一队列串行执行
+        self.input_queue = InputQueue(input_driver)
+        self.executor = ParallelExecutor(self._stop_event, self.log)
+        # 每次等待图像动作的实际等待时间，用于调整流程
+        self.wait_records: List[dict] = []
+        
+    def log(self, message: str, level: str = "info"):
+        self.observer.on_log(message, level)
+
+    def start(self) -> threading.Thread:
+        """在后台线程中执行流程"""
+        thread = threading.Thread(target=self.run, name="automation", daemon=True)
+        thread.start()
+        return thread
+
+    def _dispatch_tables(self):
+        """动作类型到处理函数的分派表，条件类动作单独返回分支键"""
+        handlers = {
+            ActionType.CLICK: self._handle_click,
+            ActionType.BATCH_CLICK: self._handle_batch_click,
+            ActionType.FIND: self._handle_find,
+            ActionType.WAIT: self._handle_wait,
+            ActionType.WAIT_FOR: self._handle_wait_for,
+        }
+        conditions = {
+            ActionType.CONDITION: self._handle_condition,
+        }
+        return handlers, conditions
+
+    def _on_begin(self, index: int, total: int, description: str):
+        self.current_action_index = index
+        self.total_actions = total
+        self._action_start_ns = self.tracer.now_ns()
+        self.observer.on_progress(int((index / total) * 100))
+        self.log(f"执行动作: {description}", "info")
+
+    def _on_end(self, index: int, description: str):
+        self.tracer.record(description, CATEGORY_ACTION, self._action_start_ns, self.tracer.now_ns(), {'index': index})
+        self.log(f"动作完成: {description}", "success")
+
+    def run(self):
+        """执行自动化流程"""
+        try:
+            # 每次执行从空的变化检测结果开始，长时间会话中不会累积
+            self.matcher.clear_gate()
+            if self.matcher.backend == BACKEND_PROCESS:
+                # 进程池在会话内常驻，仅第一次执行时需要启动
+                from process_backend import get_process_backend
+                get_process_backend().warm()
+            compiler = Compiler(*self._dispatch_tables(), parallel=self._handle_parallel)
+            interpreter = Interpreter(self._stop_event, self.log, self._on_begin, self._on_end)
+            if isinstance(self.actions, Sequence):
+                # 启动时一次性编译并验证整个流程
+                interpreter.run(compiler.compile(self.actions))
+            else:
+                self._run_stream(compiler, interpreter)
+        except Exception as e:
+            self.log(f"执行错误: {str(e)}", "error")
+        finally:
+            stats = ImageMatcher.cache_stats()
+            self.log(
+                f"模板缓存: 命中 {stats['hits']} 次, 未命中 {stats['misses']} 次, 淘汰 {stats['evictions']} 次",
+                "info")
+            matcher_stats = self.matcher.stats()
+            self.log(
+                f"区域记忆: 命中 {matcher_stats['roi_hits']} 次, 未命中 {matcher_stats['roi_misses']} 次, "
+                f"命中率 {matcher_stats['roi_hit_rate']:.0%}",
+                "info")
+            self.log(
+                f"画面未变化跳过匹配: {matcher_stats['gate_skips']}/{matcher_stats['gate_checks']} 次",
+                "info")
+            self.input_queue.close()
+            self.observer.on_finished()
+            
+    def _run_stream(self, compiler: Compiler, interpreter: Interpreter):
+        """逐个编译执行迭代器中的顶层动作，循环和条件都在单个顶层动作内部，可独立编译"""
+        actions = self.actions
+        for index, action in enumerate(actions):
+            if self._stop_event.is_set():
+                break
+            total = max(index + 1, operator.length_hint(actions))
+            interpreter.run(compiler.compile([action], index, total))
+
+    def _scales(self, params) -> Optional[Sequence[float]]:
+        """动作的多尺度匹配候选比例，未开启时返回None"""
+        if params.get('scales'):
+            return params['scales']
+        if params.get('multi_scale'):
+            return ImageMatcher.default_scales()
+        return None
+
+    def _handle_click(self, params):
+        """处理点击动作"""
+        template_path = params['template_path']
+        threshold = params.get('threshold', 0.8)
+        region = params.get('region', None)
+        position = self.matcher.find_template(template_path, threshold, region, params.get('pyramid', 0),
+                                              params.get('color_mode', ColorMode.BGR), self._scales(params))
+        if position:
+            self._click(position[0], position[1])
+            self.log(f"点击位置: {position}", "info")
+        else:
+            self.log(f"未找到图像: {template_path}", "warning")
+            
+    def _click(self, x: int, y: int):
+        """执行鼠标点击，点击后画面已变化，丢弃缓存帧"""
+        with self.tracer.span("click", CATEGORY_INPUT, x=x, y=y):
+            self.input_queue.click(x, y)
+        self.matcher.invalidate()
+
+    def _handle_find(self, params):
+        """处理查找动作"""
+        template_path = params['template_path']
+        threshold = params.get('threshold', 0.8)
+        region = params.get('region', None)
+        multi_match = params.get('multi_match', False)
+        if multi_match:
+            matches = self.matcher.find_all_templates(template_path, threshold, region, params.get('max_results'),
+                                                      params.get('color_mode', ColorMode.BGR), self._scales(params))
+            self.log(f"找到 {len(matches)} 个匹配位置", "info")
+        else:
+            position = self.matcher.find_template(template_path, threshold, region, params.get('pyramid', 0),
+                                                  params.get('color_mode', ColorMode.BGR), self._scales(params))
+            if position:
+                self.log(f"找到位置: {position}", "info")
+            else:
+                self.log(f"未找到图像: {template_path}", "warning")
+                
+    def _handle_wait(self, params):
+        """处理等待动作，停止时立即返回"""
+        duration = params['duration']
+        with self.tracer.span("wait", CATEGORY_SLEEP, duration=duration):
+            self._stop_event.wait(duration)
+        self.log(f"等待 {duration} 秒", "info")
+
+    def _handle_wait_for(self, params):
+        """处理等待图像动作
+
+        轮询直到模板出现(或消失)或超时。画面无明显变化时轮询间隔按 backoff
+        倍数增长到 max_poll_interval，得分变化明显时恢复到初始间隔。
+        """
+        template_path = params['template_path']
+        threshold = params.get('threshold', 0.8)
+        region = params.get('region', None)
+        appear = params.get('appear', True)
+        timeout = params.get('timeout', 10.0)
+        poll_interval = params.get('poll_interval', 0.05)
+        max_poll_interval = params.get('max_poll_interval', 1.0)
+        backoff = params.get('backoff', 1.5)
+
+        start = time.perf_counter()
+        interval = poll_interval
+        last_score = None
+        polls = 0
+        satisfied = False
+        while self.running:
+            self.matcher.invalidate()
+            match = self.matcher.find_each([template_path], threshold, region, pyramid=params.get('pyramid', 0),
+                                           color_mode=params.get('color_mode', ColorMode.BGR),
+                                           scales=self._scales(params)).get(template_path)
+            polls += 1
+            # 匹配出错时没有结果，状态未知，继续轮询到超时，不当作已消失
+            if match is not None and (match.position is not None) == appear:
+                satisfied = True
+                break
+            remaining = timeout - (time.perf_counter() - start)
+            if remaining <= 0:
+                break
+            score = match.score if match else 0.0
+            if last_score is not None and abs(score - last_score) > 0.05:
+                interval = poll_interval
+            last_score = score
+            with self.tracer.span("poll_wait", CATEGORY_SLEEP, interval=round(interval, 4)):
+                stopped = self._stop_event.wait(min(interval, remaining))
+            if stopped:
+                break
+            interval = min(interval * backoff, max_poll_interval)
+
+        waited = time.perf_counter() - start
+        self.wait_records.append({
+            'template_path': template_path,
+            'appear': appear,
+            'satisfied': satisfied,
+            'waited': waited,
+            'polls': polls
+        })
+        state = "出现" if appear else "消失"
+        if satisfied:
+            self.log(f"图像已{state}: {template_path}, 实际等待 {waited:.2f} 秒, 轮询 {polls} 次", "info")
+        elif self.running:
+            self.log(f"等待图像{state}超时: {template_path}, 等待 {waited:.2f} 秒, 轮询 {polls} 次", "warning")
+
+    def _handle_condition(self, params):
+        """处理条件动作，返回分支键，条件不成立返回None
+
+        配置 template_paths 时截屏一次匹配所有模板，返回得分最高的模板路径，
+        由解释器在 branches 中选择分支，没有对应分支时执行 true_actions。
+        """
+        threshold = params.get('threshold', 0.8)
+        region = params.get('region', None)
+        if 'template_paths' in params:
+            match = self.matcher.find_any(params['template_paths'], threshold, region,
+                                          params.get('parallel_match', False), params.get('pyramid', 0),
+                                          params.get('color_mode', ColorMode.BGR), self._scales(params))
+            if match:
+                self.log(f"匹配模板: {match.template_path} (得分 {match.score:.3f})", "info")
+                return match.template_path
+            return None
+        position = self.matcher.find_template(params['template_path'], threshold, region, params.get('pyramid', 0),
+                                              params.get('color_mode', ColorMode.BGR), self._scales(params))
+        return True if position else None
+
+    def _handle_batch_click(self, params):
+        """处理批量点击动作"""
+        template_path = params['template_path']
+        threshold = params.get('threshold', 0.8)
+        region = params.get('region', None)
+        matches = self.matcher.find_all_templates(template_path, threshold, region, params.get('max_results'),
+                                                  params.get('color_mode', ColorMode.BGR), self._scales(params))
+        if matches:
+            for match in matches:
+                if not self.running:
+                    break
+                self._click(match.position[0], match.position[1])
+                self.log(f"点击位置: {match.position}", "info")
+        else:
+            self.log(f"未找到图像: {template_path}", "warning")
+
+    def _handle_parallel(self, programs: List[Program]):
+        """处理并行动作，子动作在共享线程池中执行，全部结束后返回"""
+        index, total = self.current_action_index, self.total_actions
+
+        def on_progress(done: int, count: int):
+            self.observer.on_progress(int((index + done / count) / total * 100))
+
+        self.executor.execute(programs, on_progress)
+
+    def stop(self):
+        """停止执行，正在进行的等待立即中断"""
+        self.running = False
+        self._stop_event.set()
+def pyautogui_click(x: int, y: int):
+    """默认的鼠标输入实现"""
+    import pyautogui
+    pyautogui.click(x, y)
+
+
+class InputQueue:
+    """鼠标输入队列：由单个线程按提交顺序执行，避免并行动作的点击相互穿插"""
+    def __init__(self, driver: Optional[Callable[[int, int], None]] = None):
+        self.driver = driver or pyautogui_click
+        self._queue: 'queue.Queue' = queue.Queue()
+        self._thread: Optional[threading.Thread] = None
+        self._lock = threading.Lock()
+
+    def submit(self, func: Callable, *args) -> Future:
+        """提交一个输入操作，返回其Future"""
+        with self._lock:
+            if self._thread is None:
+                self._thread = threading.Thread(target=self._worker, name="input", daemon=True)
+                self._thread.start()
+        future = Future()
+        self._queue.put((future, func, args))
+        return future
+
+    def click(self, x: int, y: int):
+        """排队点击并等待完成"""
+        self.submit(self.driver, x, y).result()
+
+    def _worker(self):
+        while True:
+            item = self._queue.get()
+            if item is None:
+                break
+            future, func, args = item
+            if not future.set_running_or_notify_cancel():
+                continue
+            try:
+                future.set_result(func(*args))
+            except Exception as e:
+                future.set_exception(e)
+
+    def close(self):
+        """处理完已提交的输入后结束输入线程"""
+        with self._lock:
+            if self._thread is not None:
+                self._queue.put(None)
+                self._thread = None
+
+
+PARALLEL_MAX_WORKERS = 8
+_worker_pool: Optional[ThreadPoolExecutor] = None
+_worker_state = threading.local()
+
+
+def get_worker_pool() -> ThreadPoolExecutor:
+    """获取并行动作共享的有界线程池"""
+    global _worker_pool
+    if _worker_pool is None:
+        _worker_pool = ThreadPoolExecutor(max_workers=PARALLEL_MAX_WORKERS, thread_name_prefix="parallel")
+    return _worker_pool
+
+
+class ParallelExecutor:
+    """并行执行器
+
+    在共享线程池中运行已编译的子程序，共用所属线程的停止事件和日志回调。
+    嵌套在并行子动作中的并行动作直接在当前线程顺序执行，避免占满线程池后互相等待。
+    """
+    def __init__(self, stop_event: threading.Event, on_log: Callable[[str, str], None]):
+        self.stop_event = stop_event
+        self.on_log = on_log
+
+    def _run(self, program: Program):
+        _worker_state.active = True
+        try:
+            Interpreter(self.stop_event, self.on_log).run(program)
+        finally:
+            _worker_state.active = False
+
+    def execute(self, programs: List[Program], on_progress: Optional[Callable[[int, int], None]] = None):
+        """并行执行多个子程序，全部结束后返回"""
+        if not programs:
+            return
+        if getattr(_worker_state, 'active', False):
+            for program in programs:
+                Interpreter(self.stop_event, self.on_log).run(program)
+            return
+        pool = get_worker_pool()
+        pending = {pool.submit(self._run, program) for program in programs}
+        done_count = 0
+        while pending:
+            done, pending = wait(pending, return_when=FIRST_COMPLETED)
+            for future in done:
+                done_count += 1
+                error = future.exception()
+                if error:
+                    self.on_log(f"并行动作出错: {error}", "error")
+                if on_progress:
+                    on_progress(done_count, len(programs))
+
+    def stop(self):
+        """停止所有子动作"""
+        self.stop_event.set()
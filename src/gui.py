@@ -1,14 +1,16 @@
-import sys
 import os
 import json
+import time
+import threading
 from PyQt5.QtWidgets import *
 from PyQt5.QtCore import *
 from PyQt5.QtGui import *
-from PyQt5.QtWebEngineWidgets import QWebEngineView
-from actions import Action, ActionType, ActionTemplate
-from automation import AutomationThread
+from actions import Action, ActionType, ActionTemplate, ColorMode
+from workflow_io import DEFAULT_SETTINGS, WorkflowStream, read_workflow, save_workflow
+from log_sink import BufferedLogSink, LogRecord, create_file_logger
+from catalog import CatalogEntry, TemplateCatalog
 from datetime import datetime
-from typing import List, Dict, Any, Optional
+from typing import List, Dict, Any, Optional, Tuple
 class SplashScreen(QSplashScreen):
     """启动画面"""
     def __init__(self):
@@ -121,11 +123,13 @@ class SplashScreen(QSplashScreen):
         if not current_pixmap.isNull():
             self.setPixmap(current_pixmap.scaled(400, 300, Qt.KeepAspectRatio, Qt.SmoothTransformation))
             
-    def set_progress(self, value):
-        """设置进度"""
+    def set_progress(self, value, message: Optional[str] = None):
+        """设置进度，message 为当前初始化阶段的说明"""
         self.progress_bar.setValue(value)
         # 更新加载文字
-        if value < 30:
+        if message:
+            self.loading_label.setText(message)
+        elif value < 30:
             self.loading_label.setText("正在初始化...")
         elif value < 60:
             self.loading_label.setText("正在加载组件...")
@@ -310,93 +314,82 @@ class ThemeManager:
                 image: url(data:image/svg+xml;base64,PHN2ZyB3aWR0aD0iMTQiIGhlaWdodD0iMTQiIHZpZXdCb3g9IjAgMCAxNCAxNCIgZmlsbD0ibm9uZSIgeG1sbnM9Imh0dHA6Ly93d3cudzMub3JnLzIwMDAvc3ZnIj4KPHBhdGggZD0iTTEyIDJMNCAxMEwxIDciIHN0cm9rZT0id2hpdGUiIHN0cm9rZS13aWR0aD0iMiIgc3Ryb2tlLWxpbmVjYXA9InJvdW5kIiBzdHJva2UtbGluZWpvaW49InJvdW5kIi8+Cjwvc3ZnPgo=);
             }}
         """
-class FlowchartGenerator:
-    """流程图生成器"""
-    @staticmethod
-    def generate_flowchart(actions: List[Action]) -> str:
-        html = """
-        <!DOCTYPE html>
-        <html>
-        <head>
-            <meta charset="UTF-8">
-            <style>
-                body {
-                    font-family: Arial, sans-serif;
-                    margin: 20px;
-                    background-color: #f5f5f5;
-                }
-                .flowchart {
-                    display: flex;
-                    flex-direction: column;
-                    align-items: center;
-                }
-                .node {
-                    background-color: white;
-                    border: 2px solid #2196f3;
-                    border-radius: 8px;
-                    padding: 15px;
-                    margin: 10px;
-                    box-shadow: 0 2px 4px rgba(0,0,0,0.1);
-                    min-width: 200px;
-                    text-align: center;
-                }
-                .arrow {
-                    color: #666;
-                    font-size: 24px;
-                    margin: 5px 0;
-                }
-            </style>
-        </head>
-        <body>
-            <div class="flowchart">
-        """
-        
-        for i, action in enumerate(actions):
-            html += f'<div class="node">{i+1}. {action.description}</div>'
-            if i < len(actions) - 1:
-                html += '<div class="arrow">↓</div>'
-                
-        html += """
-            </div>
-        </body>
-        </html>
-        """
-        return html
 class TemplateManager:
-    """动作模板管理器"""
+    """动作模板管理器，列表和搜索使用目录索引，模板内容按需解析并缓存"""
     def __init__(self):
         self.templates = {}
         self.template_dir = "templates"
         if not os.path.exists(self.template_dir):
             os.makedirs(self.template_dir)
+        self.catalog = TemplateCatalog(self.template_dir)
+
+    def _file_path(self, name: str) -> str:
+        return os.path.join(self.template_dir, f"{name}.json")
             
     def save_template(self, template: ActionTemplate):
         """保存动作模板"""
-        self.templates[template.name] = template
-        file_path = os.path.join(self.template_dir, f"{template.name}.json")
-        with open(file_path, 'w') as f:
-            json.dump(template.to_dict(), f)
+        data = template.to_dict()
+        with open(self._file_path(template.name), 'w', encoding='utf-8') as f:
+            json.dump(data, f)
+        self.catalog.update(template.name, data['actions'], template.description)
+        self.templates[template.name] = (self.catalog.get(template.name).mtime_ns, template)
             
     def load_template(self, name: str) -> Optional[ActionTemplate]:
-        """加载动作模板"""
-        if name in self.templates:
-            return self.templates[name]
+        """加载动作模板，文件修改后重新解析"""
+        entry = self.catalog.get(name)
+        cached = self.templates.get(name)
+        if cached is not None and (entry is None or cached[0] == entry.mtime_ns):
+            return cached[1]
             
-        file_path = os.path.join(self.template_dir, f"{name}.json")
+        file_path = self._file_path(name)
         if os.path.exists(file_path):
-            with open(file_path, 'r') as f:
+            with open(file_path, 'r', encoding='utf-8') as f:
                 template = ActionTemplate.from_dict(json.load(f))
-                self.templates[name] = template
-                return template
+            self.templates[name] = (os.stat(file_path).st_mtime_ns, template)
+            return template
         return None
+
+    def delete_template(self, name: str):
+        """删除动作模板"""
+        file_path = self._file_path(name)
+        if os.path.exists(file_path):
+            os.remove(file_path)
+        self.templates.pop(name, None)
+        self.catalog.remove(name)
+
+    def rename_template(self, old_name: str, new_name: str) -> bool:
+        """重命名动作模板"""
+        template = self.load_template(old_name)
+        if template is None:
+            return False
+        self.delete_template(old_name)
+        template.name = new_name
+        self.save_template(template)
+        return True
         
     def list_templates(self) -> List[str]:
         """列出所有模板"""
-        templates = []
-        for file in os.listdir(self.template_dir):
-            if file.endswith('.json'):
-                templates.append(file[:-5])
-        return templates
+        return self.catalog.names()
+
+    def search_templates(self, text: str = "") -> List[CatalogEntry]:
+        """按名称、描述或引用的图像筛选模板"""
+        return self.catalog.search(text)
+
+    def refresh(self) -> bool:
+        """扫描模板目录更新索引，有变化时返回True，可在后台线程调用"""
+        return self.catalog.scan()
+
+
+class CatalogRefreshThread(QThread):
+    """在后台扫描模板目录，完成后通知界面"""
+    refreshed = pyqtSignal(bool)
+
+    def __init__(self, template_manager: TemplateManager, parent=None):
+        super().__init__(parent)
+        self.template_manager = template_manager
+
+    def run(self):
+        self.refreshed.emit(self.template_manager.refresh())
 
 class ActionNode(QGraphicsItem):
     """动作节点类"""
@@ -424,6 +417,389 @@ class ActionNode(QGraphicsItem):
             param_text += "..."
         painter.drawText(10, 40, param_text)
 
+class FlowNode(ActionNode):
+    """流程图节点，按动作类型着色，并绘制指向上一节点的连线"""
+    WIDTH = 240
+    HEIGHT = 32
+    GAP = 12
+    INDENT = 28
+    COLORS = {
+        ActionType.CLICK: '#2196f3',
+        ActionType.BATCH_CLICK: '#1565c0',
+        ActionType.FIND: '#00897b',
+        ActionType.WAIT: '#ff9800',
+        ActionType.WAIT_FOR: '#fb8c00',
+        ActionType.LOOP: '#7c4dff',
+        ActionType.CONDITION: '#e91e63',
+        ActionType.PARALLEL: '#43a047',
+        ActionType.SEQUENCE: '#6d4c41',
+    }
+
+    def __init__(self, action_type: str, text: str, depth: int, number: Optional[int] = None):
+        super().__init__(action_type, {})
+        self.text = text
+        self.depth = depth
+        # 顶层动作的序号，嵌套动作为None
+        self.number = number
+        self.setFlag(QGraphicsItem.ItemIsMovable, False)
+        self.setFlag(QGraphicsItem.ItemIsSelectable, False)
+        # 节点内容只在样式变化时重绘
+        self.setCacheMode(QGraphicsItem.DeviceCoordinateCache)
+
+    def restyle(self, action_type: str, text: str, depth: int):
+        """更新类型、文字和层级，返回是否有变化"""
+        if (action_type, text, depth) == (self.action_type, self.text, self.depth):
+            return False
+        self.action_type, self.text, self.depth = action_type, text, depth
+        self.update()
+        return True
+
+    def set_number(self, number: Optional[int]):
+        """更新序号，只有在视口内时才会实际重绘"""
+        if number != self.number:
+            self.number = number
+            self.update()
+
+    def boundingRect(self) -> QRectF:
+        # 上方留出连线空间
+        return QRectF(0, -self.GAP, self.WIDTH, self.HEIGHT + self.GAP)
+
+    def paint(self, painter: QPainter, option: QStyleOptionGraphicsItem, widget: QWidget):
+        color = QColor(self.COLORS.get(self.action_type, '#757575'))
+        painter.setPen(QPen(QColor('#9e9e9e'), 1))
+        painter.drawLine(12, -self.GAP, 12, 0)
+        painter.setPen(QPen(color, 2))
+        painter.setBrush(Qt.white)
+        painter.drawRoundedRect(0, 0, self.WIDTH, self.HEIGHT, 6, 6)
+        # 缩小到一定程度后只画色块，不绘制文字
+        if option.levelOfDetailFromTransform(painter.worldTransform()) < 0.5:
+            return
+        painter.setPen(QColor('#212121'))
+        metrics = painter.fontMetrics()
+        text = self.text if self.number is None else f"{self.number}. {self.text}"
+        text = metrics.elidedText(text, Qt.ElideRight, self.WIDTH - 16)
+        painter.drawText(QRectF(8, 0, self.WIDTH - 16, self.HEIGHT), Qt.AlignVCenter | Qt.AlignLeft, text)
+
+
+class FlowchartView(QGraphicsView):
+    """原生流程图视图
+
+    每个顶层动作对应一组节点(该动作及展开后的嵌套子动作)，节点按位置保存而不按动作对象，
+    同一动作对象在列表中出现多次时各有独立的节点。绑定模型后按模型发出的行范围
+    增删、移动和更新对应的节点组，其后的节点只平移位置和更新序号，不重新展开动作树。
+    嵌套的循环、条件、并行、序列子动作缩进显示。只绘制视口内可见的节点。
+    """
+    def __init__(self, parent=None):
+        super().__init__(parent)
+        self.flow_scene = QGraphicsScene(self)
+        self.flow_scene.setItemIndexMethod(QGraphicsScene.BspTreeIndex)
+        self.setScene(self.flow_scene)
+        self.setViewportUpdateMode(QGraphicsView.MinimalViewportUpdate)
+        self.setOptimizationFlags(QGraphicsView.DontSavePainterState | QGraphicsView.DontAdjustForAntialiasing)
+        self.setAlignment(Qt.AlignLeft | Qt.AlignTop)
+        # 每个顶层动作的节点组，第一个节点为顶层动作本身
+        self._blocks: List[List[FlowNode]] = []
+        self._row_count = 0
+        self._max_depth = 0
+
+    def set_model(self, model: 'ActionListModel'):
+        """跟随模型的行变化增量更新"""
+        model.modelReset.connect(lambda: self.sync(model.actions))
+        model.rowsInserted.connect(lambda parent, first, last: self.insert(first, model.actions[first:last + 1]))
+        model.rowsRemoved.connect(lambda parent, first, last: self.remove(first, last - first + 1))
+        # 目标位置为移动前列表中的插入点
+        model.rowsMoved.connect(lambda parent, start, end, destination, row:
+                                self.move(start, row - 1 if row > start else row))
+        model.dataChanged.connect(lambda top, bottom, roles=None:
+                                  self.refresh(top.row(), model.actions[top.row():bottom.row() + 1]))
+
+    @staticmethod
+    def _describe(item) -> Tuple[str, Dict[str, Any], str]:
+        if isinstance(item, Action):
+            return item.type, item.params, item.description
+        action_type, params = item.get('type', ''), item.get('params', {})
+        return action_type, params, item.get('description') or Action(action_type, params).description
+
+    def _flatten(self, items, depth: int, prefix: str, rows: list):
+        """展开动作树为 (类型, 文字, 层级) 行"""
+        for item in items:
+            action_type, params, description = self._describe(item)
+            rows.append((action_type, prefix + description, depth))
+            if action_type in (ActionType.LOOP, ActionType.SEQUENCE, ActionType.PARALLEL):
+                self._flatten(params.get('actions', []), depth + 1, "", rows)
+            elif action_type == ActionType.CONDITION:
+                for key, branch in params.get('branches', {}).items():
+                    self._flatten(branch, depth + 1, f"[{os.path.basename(str(key))}] ", rows)
+                self._flatten(params.get('true_actions', []), depth + 1, "[是] ", rows)
+                self._flatten(params.get('false_actions', []), depth + 1, "[否] ", rows)
+
+    def _fill_block(self, item, nodes: List[FlowNode], stats: Dict[str, int]) -> List[FlowNode]:
+        """按一个顶层动作的展开行生成节点组，依次复用 nodes 中的节点，多余的节点移出场景"""
+        rows: list = []
+        self._flatten([item], 0, "", rows)
+        block = []
+        for index, (action_type, text, depth) in enumerate(rows):
+            if index < len(nodes):
+                node = nodes[index]
+                if node.restyle(action_type, text, depth):
+                    stats['restyled'] += 1
+            else:
+                node = FlowNode(action_type, text, depth)
+                self.flow_scene.addItem(node)
+                stats['added'] += 1
+            self._max_depth = max(self._max_depth, depth)
+            block.append(node)
+        self._discard(nodes[len(rows):], stats)
+        return block
+
+    def _discard(self, nodes: List[FlowNode], stats: Optional[Dict[str, int]] = None):
+        for node in nodes:
+            self.flow_scene.removeItem(node)
+        if stats is not None:
+            stats['removed'] += len(nodes)
+
+    def _layout(self, start: int):
+        """从第 start 个顶层动作起重新设置节点位置和序号"""
+        step = FlowNode.HEIGHT + FlowNode.GAP
+        row = sum(len(block) for block in self._blocks[:start])
+        for number, block in enumerate(self._blocks[start:], start + 1):
+            for index, node in enumerate(block):
+                x, y = node.depth * FlowNode.INDENT, row * step + FlowNode.GAP
+                if node.x() != x or node.y() != y:
+                    node.setPos(x, y)
+                node.set_number(number if index == 0 else None)
+                row += 1
+        self._row_count = row
+        self._update_scene_rect()
+
+    def sync(self, actions: List[Action]) -> Dict[str, int]:
+        """与整个动作列表同步(模型重置时)，按位置复用已有节点，返回新增、删除、重绘的节点数"""
+        stats = {'added': 0, 'removed': 0, 'restyled': 0}
+        old = self._blocks
+        self._max_depth = 0
+        self._blocks = [self._fill_block(item, old[index] if index < len(old) else [], stats)
+                        for index, item in enumerate(actions)]
+        for block in old[len(actions):]:
+            self._discard(block, stats)
+        self._layout(0)
+        return stats
+
+    def insert(self, row: int, actions: List[Action]):
+        """在第 row 个顶层动作前插入，只创建这些动作的节点"""
+        stats = {'added': 0, 'removed': 0, 'restyled': 0}
+        self._blocks[row:row] = [self._fill_block(item, [], stats) for item in actions]
+        self._layout(row)
+
+    def append(self, action: Action):
+        """在末尾追加一个顶层动作"""
+        self.insert(len(self._blocks), [action])
+
+    def extend(self, actions: List[Action]):
+        """在末尾追加多个顶层动作"""
+        self.insert(len(self._blocks), actions)
+
+    def remove(self, row: int, count: int = 1):
+        """删除从第 row 个起的 count 个顶层动作的节点"""
+        for block in self._blocks[row:row + count]:
+            self._discard(block)
+        del self._blocks[row:row + count]
+        self._layout(row)
+
+    def move(self, source: int, target: int):
+        """将第 source 个顶层动作的节点组移动到第 target 个位置"""
+        self._blocks.insert(target, self._blocks.pop(source))
+        self._layout(min(source, target))
+
+    def refresh(self, row: int, actions: List[Action]):
+        """动作被修改后重新展开从第 row 个起的顶层动作，复用并重绘其已有节点"""
+        stats = {'added': 0, 'removed': 0, 'restyled': 0}
+        for index, item in enumerate(actions, row):
+            self._blocks[index] = self._fill_block(item, self._blocks[index], stats)
+        self._layout(row)
+
+    def _update_scene_rect(self):
+        step = FlowNode.HEIGHT + FlowNode.GAP
+        # 宽度只在整体同步时收缩
+        width = FlowNode.WIDTH + FlowNode.INDENT * self._max_depth
+        self.flow_scene.setSceneRect(0, 0, width, self._row_count * step + FlowNode.GAP)
+
+
+ICONS = {
+    ActionType.CLICK: "👆",
+    ActionType.FIND: "🔍",
+    ActionType.WAIT: "⏰",
+    ActionType.WAIT_FOR: "⏳",
+    ActionType.LOOP: "🔄",
+    ActionType.CONDITION: "❓",
+    ActionType.BATCH_CLICK: "👆👆"
+}
+
+
+def action_label(action: Action) -> str:
+    """动作在列表中的简短说明"""
+    params = action.params
+    if action.type == ActionType.CLICK:
+        return f"点击: {os.path.basename(params.get('template_path', '未知'))}"
+    elif action.type == ActionType.FIND:
+        return f"查找: {os.path.basename(params.get('template_path', '未知'))}"
+    elif action.type == ActionType.WAIT:
+        return f"等待: {params.get('duration', 0)} 秒"
+    elif action.type == ActionType.WAIT_FOR:
+        state = "出现" if params.get('appear', True) else "消失"
+        return f"等待{state}: {os.path.basename(params.get('template_path', '未知'))}"
+    elif action.type == ActionType.LOOP:
+        return f"循环: {params.get('count', 0)} 次"
+    elif action.type == ActionType.CONDITION:
+        return f"条件: {os.path.basename(params.get('template_path', '未知'))}"
+    elif action.type == ActionType.BATCH_CLICK:
+        return f"批量点击: {os.path.basename(params.get('template_path', '未知'))}"
+    return action.description
+
+
+class ActionListModel(QAbstractListModel):
+    """动作列表模型，直接包装动作列表，增删移动只发出对应行的信号"""
+    ActionRole = Qt.UserRole + 1
+
+    def __init__(self, actions: List[Action], parent=None):
+        super().__init__(parent)
+        self.actions = actions
+
+    def rowCount(self, parent=QModelIndex()) -> int:
+        return 0 if parent.isValid() else len(self.actions)
+
+    def data(self, index: QModelIndex, role=Qt.DisplayRole):
+        if not index.isValid():
+            return None
+        action = self.actions[index.row()]
+        if role == Qt.DisplayRole:
+            return action_label(action)
+        if role == self.ActionRole:
+            return action
+        return None
+
+    def set_actions(self, actions: List[Action]):
+        """整体替换动作列表"""
+        self.beginResetModel()
+        self.actions = actions
+        self.endResetModel()
+
+    def append_action(self, action: Action):
+        row = len(self.actions)
+        self.beginInsertRows(QModelIndex(), row, row)
+        self.actions.append(action)
+        self.endInsertRows()
+
+    def extend_actions(self, actions: List[Action]):
+        """批量追加，只发出一次插入信号"""
+        if not actions:
+            return
+        row = len(self.actions)
+        self.beginInsertRows(QModelIndex(), row, row + len(actions) - 1)
+        self.actions.extend(actions)
+        self.endInsertRows()
+
+    def insert_action(self, row: int, action: Action):
+        self.beginInsertRows(QModelIndex(), row, row)
+        self.actions.insert(row, action)
+        self.endInsertRows()
+
+    def remove_action(self, row: int):
+        if 0 <= row < len(self.actions):
+            self.beginRemoveRows(QModelIndex(), row, row)
+            self.actions.pop(row)
+            self.endRemoveRows()
+
+    def replace_action(self, row: int, action: Action):
+        """替换一行动作(编辑后)，只发出该行的数据变化信号"""
+        self.actions[row] = action
+        index = self.index(row)
+        self.dataChanged.emit(index, index)
+
+    def move_action(self, source: int, target: int):
+        """将 source 行移动到 target 行"""
+        if source == target or not (0 <= source < len(self.actions) and 0 <= target < len(self.actions)):
+            return
+        # beginMoveRows 的目标位置是移动前列表中的插入点
+        destination = target + 1 if target > source else target
+        self.beginMoveRows(QModelIndex(), source, source, QModelIndex(), destination)
+        self.actions.insert(target, self.actions.pop(source))
+        self.endMoveRows()
+
+
+class ActionItemDelegate(QStyledItemDelegate):
+    """绘制动作行：序号、图标、说明和删除按钮，删除按钮通过点击位置判断"""
+    ROW_HEIGHT = 50
+    BUTTON_SIZE = 28
+
+    delete_requested = pyqtSignal(int)
+
+    def sizeHint(self, option: QStyleOptionViewItem, index: QModelIndex) -> QSize:
+        return QSize(option.rect.width(), self.ROW_HEIGHT)
+
+    def _button_rect(self, rect: QRect) -> QRect:
+        return QRect(rect.right() - self.BUTTON_SIZE - 8, rect.center().y() - self.BUTTON_SIZE // 2,
+                     self.BUTTON_SIZE, self.BUTTON_SIZE)
+
+    def paint(self, painter: QPainter, option: QStyleOptionViewItem, index: QModelIndex):
+        painter.save()
+        rect = option.rect
+        if option.state & QStyle.State_Selected:
+            painter.fillRect(rect, option.palette.highlight())
+        action = index.data(ActionListModel.ActionRole)
+
+        # 序号
+        painter.setPen(QColor('#2196f3'))
+        font = painter.font()
+        font.setBold(True)
+        painter.setFont(font)
+        painter.drawText(QRect(rect.left() + 5, rect.top(), 35, rect.height()), Qt.AlignVCenter, f"{index.row() + 1}.")
+        font.setBold(False)
+        painter.setFont(font)
+
+        # 图标和说明
+        painter.setPen(option.palette.color(QPalette.Text))
+        painter.drawText(QRect(rect.left() + 45, rect.top(), 30, rect.height()), Qt.AlignVCenter,
+                         ICONS.get(action.type, "📌"))
+        text_rect = QRect(rect.left() + 85, rect.top(), rect.width() - 85 - self.BUTTON_SIZE - 20, rect.height())
+        text = painter.fontMetrics().elidedText(index.data(Qt.DisplayRole), Qt.ElideRight, text_rect.width())
+        painter.drawText(text_rect, Qt.AlignVCenter, text)
+
+        # 删除按钮
+        button = self._button_rect(rect)
+        painter.setRenderHint(QPainter.Antialiasing)
+        painter.setPen(Qt.NoPen)
+        painter.setBrush(QColor('#cc0000' if option.state & QStyle.State_MouseOver else '#ff4444'))
+        painter.drawEllipse(button)
+        painter.setPen(Qt.white)
+        font.setBold(True)
+        font.setPixelSize(18)
+        painter.setFont(font)
+        painter.drawText(button, Qt.AlignCenter, "×")
+        painter.restore()
+
+    def editorEvent(self, event: QEvent, model: QAbstractItemModel, option: QStyleOptionViewItem, index: QModelIndex) -> bool:
+        if (event.type() == QEvent.MouseButtonRelease and event.button() == Qt.LeftButton
+                and self._button_rect(option.rect).contains(event.pos())):
+            self.delete_requested.emit(index.row())
+            return True
+        return super().editorEvent(event, model, option, index)
+
+
+class ActionListView(QListView):
+    """动作列表视图，行高固定，列表为空时显示提示"""
+    def __init__(self, parent=None):
+        super().__init__(parent)
+        self.setUniformItemSizes(True)
+        self.setMouseTracking(True)
+
+    def paintEvent(self, event):
+        super().paintEvent(event)
+        if self.model() is None or self.model().rowCount() == 0:
+            painter = QPainter(self.viewport())
+            painter.setPen(QColor('#999999'))
+            painter.drawText(self.viewport().rect(), Qt.AlignCenter, "暂无动作，请添加动作")
+
+
 class ActionEditor(QWidget):
     """动作可视化编辑器"""
     def __init__(self, parent=None):
@@ -451,6 +827,7 @@ class ActionEditor(QWidget):
             ("点击", self.add_click_action),
             ("查找", self.add_find_action),
             ("等待", self.add_wait_action),
+            ("等待图像", self.add_wait_for_action),
             ("循环", self.add_loop_action),
             ("条件", self.add_condition_action),
             ("并行", self.add_parallel_action),
@@ -467,18 +844,18 @@ class ActionEditor(QWidget):
 
     def add_action(self, action: Action):
         """添加动作到编辑器"""
-        self.actions.append(action)
+        window = self.window()
+        if isinstance(window, AutomationWindow):
+            # 与主窗口共享动作列表，通过模型追加以只刷新新增的行
+            window.append_action(action)
+        else:
+            self.actions.append(action)
         node = ActionNode(action.type, action.params)
         # 设置节点位置
         node.setPos(len(self.actions) * 160, 0)
         self.scene.addItem(node)
-        # 确保场景边界包含所有节点
-        self.scene.setSceneRect(self.scene.itemsBoundingRect())
-        # 通知主窗口更新
-        if self.parent() and isinstance(self.parent(), AutomationWindow):
-            self.parent().actions.append(action)  # 同步到主窗口
-            self.parent().update_action_list()
-            self.parent().update_flowchart()
+        # 确保场景边界包含所有节点，只合并新节点的边界
+        self.scene.setSceneRect(self.scene.sceneRect().united(node.sceneBoundingRect()))
         return action
     def add_click_action(self):
         """添加点击动作"""
@@ -486,8 +863,6 @@ class ActionEditor(QWidget):
         if dialog.exec_():
             action = Action(ActionType.CLICK, dialog.get_params())
             self.add_action(action)
-            if self.parent() and isinstance(self.parent(), AutomationWindow):
-                self.parent().update_flowchart()        
 
     def add_find_action(self):
         """添加查找动作"""
@@ -495,8 +870,6 @@ class ActionEditor(QWidget):
         if dialog.exec_():
             action = Action(ActionType.FIND, dialog.get_params())
             self.add_action(action)
-            if self.parent() and isinstance(self.parent(), AutomationWindow):
-                self.parent().update_flowchart()
 
     def add_wait_action(self):
         """添加等待动作"""
@@ -504,8 +877,13 @@ class ActionEditor(QWidget):
         if dialog.exec_():
             action = Action(ActionType.WAIT, dialog.get_params())
             self.add_action(action)
-            if self.parent() and isinstance(self.parent(), AutomationWindow):
-                self.parent().update_flowchart()
+
+    def add_wait_for_action(self):
+        """添加等待图像动作"""
+        dialog = WaitForActionDialog()
+        if dialog.exec_():
+            action = Action(ActionType.WAIT_FOR, dialog.get_params())
+            self.add_action(action)
 
     def add_loop_action(self):
         """添加循环动作"""
@@ -513,8 +891,6 @@ class ActionEditor(QWidget):
         if dialog.exec_():
             action = Action(ActionType.LOOP, dialog.get_params())
             self.add_action(action)
-            if self.parent() and isinstance(self.parent(), AutomationWindow):
-                self.parent().update_flowchart()
 
     def add_condition_action(self):
         """添加条件动作"""
@@ -522,8 +898,6 @@ class ActionEditor(QWidget):
         if dialog.exec_():
             action = Action(ActionType.CONDITION, dialog.get_params())
             self.add_action(action)
-            if self.parent() and isinstance(self.parent(), AutomationWindow):
-                self.parent().update_flowchart()
 
     def add_parallel_action(self):
         """添加并行动作"""
@@ -531,8 +905,6 @@ class ActionEditor(QWidget):
         if dialog.exec_():
             action = Action(ActionType.PARALLEL, dialog.get_params())
             self.add_action(action)
-            if self.parent() and isinstance(self.parent(), AutomationWindow):
-                self.parent().update_flowchart()
 
     def add_sequence_action(self):
         """添加序列动作"""
@@ -540,8 +912,6 @@ class ActionEditor(QWidget):
         if dialog.exec_():
             action = Action(ActionType.SEQUENCE, dialog.get_params())
             self.add_action(action)
-            if self.parent() and isinstance(self.parent(), AutomationWindow):
-                self.parent().update_flowchart()
 class BaseActionDialog(QDialog):
     """动作对话框基类"""
     def __init__(self, title: str, description: str, parent=None):
@@ -585,6 +955,18 @@ class BaseActionDialog(QDialog):
         self.threshold.setSuffix(" (0.1-1.0)")
         threshold_layout.addWidget(self.threshold)
         self.layout.addLayout(threshold_layout)
+
+        color_layout = QHBoxLayout()
+        color_layout.addWidget(QLabel('颜色模式:'))
+        self.color_mode = QComboBox()
+        for mode in ColorMode.ALL:
+            self.color_mode.addItem(ColorMode.LABELS[mode], mode)
+        self.color_mode.setToolTip('颜色无关的按钮选择灰度或单通道可显著加快匹配')
+        color_layout.addWidget(self.color_mode)
+        self.layout.addLayout(color_layout)
+
+        self.multi_scale = QCheckBox('多尺度匹配(模板与屏幕缩放比例不同时使用)')
+        self.layout.addWidget(self.multi_scale)
         
     def add_preview_area(self):
         """添加预览区域"""
@@ -634,6 +1016,10 @@ class BaseActionDialog(QDialog):
             params['template_path'] = self.template_path.text()
         if hasattr(self, 'threshold'):
             params['threshold'] = self.threshold.value()
+        if hasattr(self, 'color_mode') and self.color_mode.currentData() != ColorMode.BGR:
+            params['color_mode'] = self.color_mode.currentData()
+        if hasattr(self, 'multi_scale') and self.multi_scale.isChecked():
+            params['multi_scale'] = True
         return params
 class ParallelActionDialog(BaseActionDialog):
     def __init__(self, parent=None):
@@ -692,11 +1078,44 @@ class SequenceActionDialog(BaseActionDialog):
         return {
             'actions': [action.to_dict() for action in self.actions]
         }
+class CatalogListModel(QAbstractListModel):
+    """动作模板列表模型，提示信息在显示时才生成"""
+    def __init__(self, parent=None):
+        super().__init__(parent)
+        self.entries: List[CatalogEntry] = []
+
+    def rowCount(self, parent=QModelIndex()) -> int:
+        return 0 if parent.isValid() else len(self.entries)
+
+    def data(self, index: QModelIndex, role=Qt.DisplayRole):
+        if not index.isValid():
+            return None
+        entry = self.entries[index.row()]
+        if role == Qt.DisplayRole:
+            return entry.name
+        if role == Qt.ToolTipRole:
+            lines = [f"{entry.action_count} 个动作"]
+            if entry.description:
+                lines.append(entry.description)
+            lines.extend(entry.image_paths[:10])
+            return "\n".join(lines)
+        return None
+
+    def set_entries(self, entries: List[CatalogEntry]):
+        self.beginResetModel()
+        self.entries = entries
+        self.endResetModel()
+
+
 class TemplateManagerDialog(QDialog):
     """模板管理对话框"""
+    # 搜索输入停止后多久开始筛选(毫秒)
+    SEARCH_DELAY = 150
+
     def __init__(self, template_manager: TemplateManager, parent=None):
         super().__init__(parent)
         self.template_manager = template_manager
+        self.scanning = False
         self.init_ui()
         
     def init_ui(self):
@@ -704,11 +1123,27 @@ class TemplateManagerDialog(QDialog):
         self.setFixedSize(600, 400)
         
         layout = QVBoxLayout()
+
+        # 搜索框，按名称、描述或引用的图像筛选
+        self.search_edit = QLineEdit()
+        self.search_edit.setPlaceholderText('搜索模板名称、描述或图像路径')
+        self.search_edit.setClearButtonEnabled(True)
+        self.search_timer = QTimer(self)
+        self.search_timer.setSingleShot(True)
+        self.search_timer.setInterval(self.SEARCH_DELAY)
+        self.search_timer.timeout.connect(self.refresh_template_list)
+        self.search_edit.textChanged.connect(self.search_timer.start)
+        layout.addWidget(self.search_edit)
         
         # 模板列表
-        self.template_list = QListWidget()
-        self.refresh_template_list()
+        self.template_model = CatalogListModel(self)
+        self.template_list = QListView()
+        self.template_list.setUniformItemSizes(True)
+        self.template_list.setModel(self.template_model)
         layout.addWidget(self.template_list)
+
+        self.status_label = QLabel()
+        layout.addWidget(self.status_label)
         
         # 按钮区域
         button_layout = QHBoxLayout()
@@ -729,50 +1164,93 @@ class TemplateManagerDialog(QDialog):
         
         layout.addLayout(button_layout)
         self.setLayout(layout)
+
+        # 先显示索引中的内容，后台扫描目录发现变化后再刷新
+        self.refresh_template_list()
+        self.refresh_thread = CatalogRefreshThread(self.template_manager, self)
+        self.refresh_thread.refreshed.connect(self.on_catalog_refreshed)
+        self.scanning = True
+        self.refresh_thread.start()
+        self.update_status()
         
     def refresh_template_list(self):
-        """刷新模板列表"""
-        self.template_list.clear()
-        templates = self.template_manager.list_templates()
-        self.template_list.addItems(templates)
+        """按搜索条件刷新模板列表，数据来自内存中的索引"""
+        self.template_model.set_entries(self.template_manager.search_templates(self.search_edit.text()))
+        self.update_status()
+
+    def update_status(self):
+        text = f"显示 {self.template_model.rowCount()} / {len(self.template_manager.catalog)} 个模板"
+        if self.scanning:
+            text += "，正在扫描模板目录..."
+        self.status_label.setText(text)
+
+    def on_catalog_refreshed(self, changed: bool):
+        self.scanning = False
+        if changed:
+            self.refresh_template_list()
+        else:
+            self.update_status()
+
+    def current_name(self) -> Optional[str]:
+        index = self.template_list.currentIndex()
+        return index.data() if index.isValid() else None
+
+    # 对话框关闭后仍在扫描、且没有父窗口可以接管的线程，结束后释放
+    _background_threads: set = set()
+
+    def done(self, result):
+        # 扫描可能在等待启动时的全量扫描，不阻塞关闭：断开界面信号，线程交给父窗口持有直到结束
+        thread = self.refresh_thread
+        if thread.isRunning():
+            thread.refreshed.disconnect(self.on_catalog_refreshed)
+            owner = self.parent()
+            thread.setParent(owner)
+            if owner is None:
+                TemplateManagerDialog._background_threads.add(thread)
+                thread.finished.connect(lambda: TemplateManagerDialog._background_threads.discard(thread))
+            else:
+                thread.finished.connect(thread.deleteLater)
+        super().done(result)
         
     def delete_template(self):
         """删除选中的模板"""
-        current_item = self.template_list.currentItem()
-        if current_item:
-            template_name = current_item.text()
+        template_name = self.current_name()
+        if template_name:
             reply = QMessageBox.question(self, '确认删除', f'确定要删除模板 "{template_name}" 吗？')
             if reply == QMessageBox.Yes:
-                file_path = os.path.join(self.template_manager.template_dir, f"{template_name}.json")
-                if os.path.exists(file_path):
-                    os.remove(file_path)
+                self.template_manager.delete_template(template_name)
                 self.refresh_template_list()
                 
     def rename_template(self):
         """重命名选中的模板"""
-        current_item = self.template_list.currentItem()
-        if current_item:
-            old_name = current_item.text()
+        old_name = self.current_name()
+        if old_name:
             new_name, ok = QInputDialog.getText(self, '重命名', '请输入新名称:', text=old_name)
             if ok and new_name and new_name != old_name:
-                # 加载旧模板
-                template = self.template_manager.load_template(old_name)
-                if template:
-                    # 删除旧文件
-                    old_path = os.path.join(self.template_manager.template_dir, f"{old_name}.json")
-                    if os.path.exists(old_path):
-                        os.remove(old_path)
-                    # 保存新模板
-                    template.name = new_name
-                    self.template_manager.save_template(template)
+                if self.template_manager.rename_template(old_name, new_name):
                     self.refresh_template_list()
 class AutomationWindow(QMainWindow):
+    # 日志面板保留的最大行数
+    LOG_MAX_LINES = 2000
+    # 日志批量刷新间隔(毫秒)
+    LOG_FLUSH_INTERVAL = 100
+    # 开启日志文件时默认建议的路径，文件按大小轮转
+    LOG_FILE = 'automation.log'
+    # 流程文件分批载入，每批占用界面线程的时间上限(毫秒)
+    LOAD_SLICE_MS = 30
+    # 解析出的动作至少累积这么多才插入列表和流程图
+    LOAD_MIN_FLUSH = 2000
+
     def __init__(self):
         super().__init__()
         self.actions = []
         self.automation_thread = None
+        # 随流程文件保存的流程级设置
+        self.workflow_settings = dict(DEFAULT_SETTINGS)
         self.is_dark_mode = False
         self.template_manager = TemplateManager()
+        # 启动时在后台更新模板索引，不阻塞界面
+        threading.Thread(target=self.template_manager.refresh, name="catalog-refresh", daemon=True).start()
         
         # 设置窗口标志
         self.setWindowFlags(Qt.Window | Qt.WindowCloseButtonHint)
@@ -844,7 +1322,8 @@ class AutomationWindow(QMainWindow):
             ('开始执行', self.start_automation),
             ('停止执行', self.stop_automation),
             ('保存流程', self.save_workflow),
-            ('加载流程', self.load_workflow)
+            ('加载流程', self.load_workflow),
+            ('导出流程包', self.export_pack)
         ]
         
         for text, handler in actions:
@@ -859,16 +1338,23 @@ class AutomationWindow(QMainWindow):
         template_toolbar.addAction("模板管理", self.show_template_manager)
         self.addToolBar(template_toolbar)
         
-        # 创建动作编辑器
+        # 创建动作编辑器，与主窗口共享同一个动作列表
         self.action_editor = ActionEditor()
+        self.action_editor.actions = self.actions
         layout.addWidget(self.action_editor)
         # 创建流程图视图
-        self.flowchart_view = QWebEngineView()
+        self.flowchart_view = FlowchartView()
         self.flowchart_view.setMaximumHeight(100)
         layout.addWidget(self.flowchart_view)
 
         # 创建动作列表
-        self.action_list = QListWidget()
+        self.action_model = ActionListModel(self.actions, self)
+        self.flowchart_view.set_model(self.action_model)
+        self.action_delegate = ActionItemDelegate(self)
+        self.action_delegate.delete_requested.connect(self.remove_action)
+        self.action_list = ActionListView()
+        self.action_list.setModel(self.action_model)
+        self.action_list.setItemDelegate(self.action_delegate)
         self.action_list.setMaximumHeight(120)
         layout.addWidget(self.action_list)
 
@@ -880,7 +1366,16 @@ class AutomationWindow(QMainWindow):
         self.stop_btn = QPushButton('停止执行')
         self.stop_btn.clicked.connect(self.stop_automation)
         self.stop_btn.setEnabled(False)
-        layout.addWidget(self.stop_btn)        
+        layout.addWidget(self.stop_btn)
+
+        self.process_backend_check = QCheckBox('多进程匹配')
+        self.process_backend_check.setToolTip('匹配时使用多个CPU核心：多个模板、多个缩放比例分别分发，整幅搜索按行分段，随流程保存')
+        self.process_backend_check.toggled.connect(self.set_process_backend)
+        layout.addWidget(self.process_backend_check)
+        self.log_file_check = QCheckBox('写入日志文件')
+        self.log_file_check.setToolTip('执行日志同时写入按大小轮转的日志文件')
+        self.log_file_check.toggled.connect(self.set_log_file)
+        layout.addWidget(self.log_file_check)
         # 创建日志输出区域
         log_container = QWidget()
         log_layout = QVBoxLayout()
@@ -893,7 +1388,24 @@ class AutomationWindow(QMainWindow):
         self.log_text = QTextEdit()
         self.log_text.setMaximumHeight(120)
         self.log_text.setReadOnly(True)
+        # 只保留最近的日志行，超出后自动删除最早的行
+        self.log_text.document().setMaximumBlockCount(self.LOG_MAX_LINES)
         log_layout.addWidget(self.log_text)
+
+        # 执行线程写入缓冲区，界面定时批量刷新
+        self.log_file_path = self.LOG_FILE
+        self.log_sink = BufferedLogSink()
+        self.log_timer = QTimer(self)
+        self.log_timer.setInterval(self.LOG_FLUSH_INTERVAL)
+        self.log_timer.timeout.connect(self.flush_logs)
+
+        # 大流程文件边解析边显示，每次事件循环空闲时载入一批
+        self.workflow_stream = None
+        self.workflow_actions = None
+        self.pending_actions: List[Action] = []
+        self.load_timer = QTimer(self)
+        self.load_timer.setInterval(0)
+        self.load_timer.timeout.connect(self.load_workflow_batch)
         
         log_container.setLayout(log_layout)
         layout.addWidget(log_container)
@@ -907,9 +1419,7 @@ class AutomationWindow(QMainWindow):
 
     def update_flowchart(self):
         """更新流程图显示"""
-        if self.actions:
-            html = FlowchartGenerator.generate_flowchart(self.actions)
-            self.flowchart_view.setHtml(html)
+        self.flowchart_view.sync(self.actions)
     def add_click_action(self):
         """添加点击动作"""
         dialog = ClickActionDialog()
@@ -931,6 +1441,13 @@ class AutomationWindow(QMainWindow):
             action = Action(ActionType.WAIT, dialog.get_params())
             return self.action_editor.add_action(action)
 
+    def add_wait_for_action(self):
+        """添加等待图像动作"""
+        dialog = WaitForActionDialog()
+        if dialog.exec_():
+            action = Action(ActionType.WAIT_FOR, dialog.get_params())
+            return self.action_editor.add_action(action)
+
     def add_loop_action(self):
         """添加循环动作"""
         dialog = LoopActionDialog()
@@ -956,14 +1473,21 @@ class AutomationWindow(QMainWindow):
         if not self.actions:
             QMessageBox.warning(self, '警告', '请先添加动作！')
             return
+        if self.workflow_stream is not None:
+            QMessageBox.warning(self, '警告', '流程尚未加载完成！')
+            return
             
         self.start_btn.setEnabled(False)
         self.stop_btn.setEnabled(True)
         self.progress_bar.setVisible(True)
         self.progress_bar.setValue(0)
         
-        self.automation_thread = AutomationThread(self.actions)
+        # 识别引擎依赖cv2/numpy，延迟到首次执行时导入(启动后通常已在后台预加载)
+        from automation import AutomationThread
+        self.automation_thread = AutomationThread(self.actions, log_sink=self.log_sink,
+                                                  match_backend=self.workflow_settings['match_backend'])
         self.automation_thread.log_signal.connect(self.add_log)
+        self.log_timer.start()
         self.automation_thread.progress_signal.connect(self.update_progress)
         self.automation_thread.finished.connect(self.automation_finished)
         self.automation_thread.start()
@@ -977,142 +1501,204 @@ class AutomationWindow(QMainWindow):
         self.progress_bar.setValue(value)  
     def automation_finished(self):
         """自动化流程执行完成"""
+        self.log_timer.stop()
+        self.flush_logs()
         self.start_btn.setEnabled(True)
         self.stop_btn.setEnabled(False)
         self.progress_bar.setVisible(False)
         
+    def set_actions(self, actions: List[Action]):
+        """替换全部动作"""
+        self.actions = actions
+        self.action_editor.actions = actions
+        self.action_model.set_actions(actions)
+
+    def append_action(self, action: Action):
+        """追加动作，只插入一行，流程图随模型追加对应的节点"""
+        self.action_model.append_action(action)
+
     def clear_actions(self):
         """清除所有动作"""
-        self.actions = []
-        self.action_list.clear()
+        self.set_actions([])
         
+    def set_process_backend(self, enabled: bool):
+        """切换当前流程的匹配后端"""
+        self.workflow_settings['match_backend'] = 'process' if enabled else 'thread'
+
+    def closeEvent(self, event):
+        """关闭窗口时等待已排队的日志写入文件"""
+        self.log_sink.close()
+        super().closeEvent(event)
+
+    def set_log_file(self, enabled: bool):
+        """开启时选择日志文件，日志在界面刷新时批量写入"""
+        if not enabled:
+            self.log_sink.set_file_logger(None)
+            self.log_file_check.setToolTip('执行日志同时写入按大小轮转的日志文件')
+            return
+        file_path, _ = QFileDialog.getSaveFileName(self, '选择日志文件', self.log_file_path,
+                                                   'Log Files (*.log);;All Files (*)')
+        if not file_path:
+            self.log_file_check.setChecked(False)
+            return
+        try:
+            file_logger = create_file_logger(file_path)
+        except OSError as e:
+            QMessageBox.warning(self, '无法写入日志文件', str(e))
+            self.log_file_check.setChecked(False)
+            return
+        self.log_file_path = file_path
+        self.log_sink.set_file_logger(file_logger)
+        self.log_file_check.setToolTip(f"执行日志同时写入 {file_path}")
+
     def save_workflow(self):
         """保存工作流程"""
-        file_path, _ = QFileDialog.getSaveFileName(self, '保存工作流程', '', 'JSON Files (*.json)')
+        file_path, _ = QFileDialog.getSaveFileName(self, '保存工作流程', '',
+                                                   'JSON Files (*.json);;JSON Lines (*.jsonl)')
         if file_path:
-            with open(file_path, 'w') as f:
-                json.dump([action.to_dict() for action in self.actions], f)
+            save_workflow(file_path, self.actions, self.workflow_settings)
                 
     def load_workflow(self):
         """加载工作流程"""
-        file_path, _ = QFileDialog.getOpenFileName(self, '加载工作流程', '', 'JSON Files (*.json)')
-        if file_path:
-            with open(file_path, 'r') as f:
-                data = json.load(f)
-                self.actions = [Action.from_dict(item) for item in data]
-                self.update_action_list()
-                
-    def update_action_list(self):
-        """更新动作列表显示"""
-        self.action_list.clear()
-        self.action_list.setVisible(True)
-
-        if not self.action_editor.actions:  # 使用编辑器的动作列表
-            empty_item = QListWidgetItem("暂无动作，请添加动作")
-            empty_item.setTextAlignment(Qt.AlignCenter)
-            self.action_list.addItem(empty_item)
+        file_path, _ = QFileDialog.getOpenFileName(self, '加载工作流程', '',
+                                                   'Workflow Files (*.json *.jsonl *.xmpack);;JSON Files (*.json *.jsonl);;'
+                                                   'Workflow Packs (*.xmpack)')
+        if not file_path:
             return
+        self.cancel_workflow_load()
+        from pack import is_container
+        try:
+            if is_container(file_path):
+                actions, settings = read_workflow(file_path)
+                stream = None
+            else:
+                # 普通流程文件分批载入，界面在解析期间保持响应
+                stream = WorkflowStream(file_path)
+                actions, settings = [], stream.settings
+        except (OSError, ValueError, KeyError) as e:
+            QMessageBox.warning(self, '加载失败', f"无法读取流程文件: {e}")
+            return
+        self.workflow_settings = settings
+        self.process_backend_check.setChecked(self.workflow_settings['match_backend'] == 'process')
+        self.set_actions(actions)
+        if stream is not None:
+            # 保存流对象本身，取消时即使迭代尚未开始也能关闭文件
+            self.workflow_stream = stream
+            self.workflow_actions = iter(stream)
+            self.load_timer.start()
 
-        for i, action in enumerate(self.action_editor.actions):  # 使用编辑器的动作列表
-            item = QListWidgetItem()
-            widget = QWidget()
-            layout = QHBoxLayout()
-            layout.setContentsMargins(5, 8, 5, 8)  # 增加上下边距
-            layout.setSpacing(10)  # 增加元素间距
-            
-            # 添加序号
-            num_label = QLabel(f"{i+1}.")
-            num_label.setStyleSheet("font-weight: bold; color: #2196f3; min-width: 30px;")
-            layout.addWidget(num_label)
-            
-            # 添加动作类型图标
-            icon_label = QLabel()
-            icons = {
-                ActionType.CLICK: "👆",
-                ActionType.FIND: "🔍",
-                ActionType.WAIT: "⏰",
-                ActionType.LOOP: "🔄",
-                ActionType.CONDITION: "❓",
-                ActionType.BATCH_CLICK: "👆👆"
-            }
-            icon_label.setText(icons.get(action.type, "📌"))
-            icon_label.setStyleSheet("min-width: 20px;")
-            layout.addWidget(icon_label)
-            
-            # 添加动作描述
-            desc_label = QLabel()
-            if action.type == ActionType.CLICK:
-                template_path = action.params.get('template_path', '未知')
-                desc_label.setText(f"点击: {os.path.basename(template_path)}")
-            elif action.type == ActionType.FIND:
-                template_path = action.params.get('template_path', '未知')
-                desc_label.setText(f"查找: {os.path.basename(template_path)}")
-            elif action.type == ActionType.WAIT:
-                duration = action.params.get('duration', 0)
-                desc_label.setText(f"等待: {duration} 秒")
-            elif action.type == ActionType.LOOP:
-                count = action.params.get('count', 0)
-                desc_label.setText(f"循环: {count} 次")
-            elif action.type == ActionType.CONDITION:
-                template_path = action.params.get('template_path', '未知')
-                desc_label.setText(f"条件: {os.path.basename(template_path)}")
-            elif action.type == ActionType.BATCH_CLICK:
-                template_path = action.params.get('template_path', '未知')
-                desc_label.setText(f"批量点击: {os.path.basename(template_path)}")
-            desc_label.setStyleSheet("padding: 0 10px;")
-            desc_label.setWordWrap(True)  # 允许文字换行
-            layout.addWidget(desc_label)
-            
-            # 添加弹性空间
-            layout.addStretch()
-            
-            # 添加删除按钮
-            delete_btn = QPushButton("×")
-            delete_btn.setFixedSize(28, 28)
-            delete_btn.setStyleSheet("""
-                QPushButton {
-                    background: #ff4444;
-                    color: white;
-                    border: none;
-                    border-radius: 14px;
-                    font-weight: bold;
-                    font-size: 18px;
-                }
-                QPushButton:hover {
-                    background: #cc0000;
-                }
-            """)
-            delete_btn.clicked.connect(lambda checked, index=i: self.remove_action(index))
-            layout.addWidget(delete_btn)
-            
-            widget.setLayout(layout)
-            # 设置合适的高度，确保内容完整显示
-            item.setSizeHint(QSize(widget.sizeHint().width(), 50))
-            self.action_list.addItem(item)
-            self.action_list.setItemWidget(item, widget)
-        
-        self.update_flowchart()
+    def load_workflow_batch(self):
+        """解析下一批动作，每批不超过 LOAD_SLICE_MS
+
+        列表和流程图每次插入的开销随已有行数增长，解析出的动作先暂存，
+        暂存数量达到已显示数量的一半(至少 LOAD_MIN_FLUSH)时才批量插入，插入次数为对数级。
+        """
+        deadline = time.perf_counter() + self.LOAD_SLICE_MS / 1000
+        pending = self.pending_actions
+        finished = False
+        try:
+            for action in self.workflow_actions:
+                pending.append(action)
+                if len(pending) % 64 == 0 and time.perf_counter() >= deadline:
+                    break
+            else:
+                finished = True
+        except (ValueError, KeyError) as e:
+            self.cancel_workflow_load()
+            self.add_log(f"流程文件格式错误，已载入前 {len(self.actions)} 个动作: {e}", "error")
+            return
+        if finished or len(pending) >= max(self.LOAD_MIN_FLUSH, len(self.actions) // 2):
+            self.flush_pending_actions()
+        if finished:
+            self.cancel_workflow_load()
+            self.add_log(f"流程加载完成: {len(self.actions)} 个动作", "success")
+
+    def flush_pending_actions(self):
+        batch, self.pending_actions = self.pending_actions, []
+        self.action_model.extend_actions(batch)
 
+    def cancel_workflow_load(self):
+        """停止分批载入并关闭文件"""
+        self.load_timer.stop()
+        if self.workflow_stream is not None:
+            self.workflow_stream.close()
+            self.workflow_stream = None
+            self.workflow_actions = None
+        # 已解析的部分保留显示
+        self.flush_pending_actions()
+
+    def export_pack(self):
+        """将当前流程及其模板导出为流程包"""
+        if not self.actions:
+            QMessageBox.warning(self, '警告', '请先添加动作！')
+            return
+        file_path, _ = QFileDialog.getSaveFileName(self, '导出流程包', '', 'Workflow Packs (*.xmpack)')
+        if not file_path:
+            return
+        from pack import write_pack
+        try:
+            write_pack(file_path, self.actions, self.workflow_settings)
+        except ValueError as e:
+            QMessageBox.warning(self, '导出失败', str(e))
+            return
+        self.add_log(f"已导出流程包: {file_path}", "success")
+                
+    def update_action_list(self):
+        """重新加载整个动作列表显示"""
+        self.action_model.set_actions(self.actions)
 
     def remove_action(self, index):
-        """删除指定索引的动作"""
+        """删除指定索引的动作，流程图只移除该动作的节点"""
         if 0 <= index < len(self.actions):
-            self.actions.pop(index)
-            self.update_action_list()
+            self.action_model.remove_action(index)
                 
+    LOG_COLORS = {
+        "info": "#2196f3",
+        "warning": "#ff9800",
+        "error": "#f44336",
+        "success": "#4caf50"
+    }
+
     def add_log(self, message, level="info"):
         """添加日志消息"""
-        timestamp = datetime.now().strftime("%H:%M:%S")
-        colors = {
-            "info": "#2196f3",
-            "warning": "#ff9800",
-            "error": "#f44336",
-            "success": "#4caf50"
-        }
-        color = colors.get(level, "#333333")
-        formatted_message = f'<span style="color: {color}">[{timestamp}] {message}</span>'
-        self.log_text.append(formatted_message)
-        self.log_text.verticalScrollBar().setValue(self.log_text.verticalScrollBar().maximum())
+        self.log_sink.write(message, level)
+        if not self.log_timer.isActive():
+            self.flush_logs()
+
+    def flush_logs(self):
+        """将缓冲区中的日志一次性追加到日志面板"""
+        records = self.log_sink.drain()
+        dropped = self.log_sink.take_dropped()
+        if not records and not dropped:
+            return
+        # 超出显示上限的部分写入后也会被立即删除，直接跳过
+        skipped = max(len(records) - self.LOG_MAX_LINES, 0) + dropped
+        if len(records) > self.LOG_MAX_LINES:
+            records = records[-self.LOG_MAX_LINES:]
+
+        scroll_bar = self.log_text.verticalScrollBar()
+        at_bottom = scroll_bar.value() >= scroll_bar.maximum() - 4
+        cursor = QTextCursor(self.log_text.document())
+        cursor.movePosition(QTextCursor.End)
+        cursor.beginEditBlock()
+        if skipped:
+            self._insert_log_line(cursor, LogRecord(records[0].timestamp if records else 0, "warning",
+                                                    f"日志过多，已省略 {skipped} 条"))
+        for record in records:
+            self._insert_log_line(cursor, record)
+        cursor.endEditBlock()
+        # 用户向上翻看历史时不强制滚动
+        if at_bottom:
+            scroll_bar.setValue(scroll_bar.maximum())
+
+    def _insert_log_line(self, cursor: QTextCursor, record: LogRecord):
+        if not self.log_text.document().isEmpty():
+            cursor.insertBlock()
+        timestamp = datetime.fromtimestamp(record.timestamp).strftime("%H:%M:%S")
+        color = self.LOG_COLORS.get(record.level, "#333333")
+        message = record.message.replace("&", "&amp;").replace("<", "&lt;").replace(">", "&gt;")
+        cursor.insertHtml(f'<span style="color: {color}">[{timestamp}] {message}</span>')
+
     def add_animation_effects(self):
         """添加动画效果"""
         # 添加淡入效果
@@ -1190,6 +1776,7 @@ class AutomationWindow(QMainWindow):
         
     def load_actions_to_editor(self, actions: List[Action]):
         """将动作加载到编辑器"""
+        self.set_actions(list(actions))
         self.action_editor.scene.clear()
         for action in actions:
             node = ActionNode(action.type, action.params)
@@ -1254,6 +1841,54 @@ class WaitActionDialog(BaseActionDialog):
             'duration': self.duration.value()
         }
 
+class WaitForActionDialog(BaseActionDialog):
+    def __init__(self, parent=None):
+        super().__init__('添加等待图像动作', '等待图像动作将反复检测屏幕，直到指定图像出现或消失', parent)
+        self.add_template_selection("选择要等待的图像模板")
+        self.add_threshold_selection()
+        
+        # 等待条件
+        mode_layout = QHBoxLayout()
+        mode_layout.addWidget(QLabel('等待条件:'))
+        self.mode = QComboBox()
+        self.mode.addItems(['图像出现', '图像消失'])
+        mode_layout.addWidget(self.mode)
+        self.layout.addLayout(mode_layout)
+        
+        # 超时时间
+        timeout_layout = QHBoxLayout()
+        timeout_layout.addWidget(QLabel('超时时间:'))
+        self.timeout = QDoubleSpinBox()
+        self.timeout.setRange(0.1, 600.0)
+        self.timeout.setSingleStep(1.0)
+        self.timeout.setValue(10.0)
+        self.timeout.setSuffix(" 秒")
+        timeout_layout.addWidget(self.timeout)
+        self.layout.addLayout(timeout_layout)
+        
+        # 初始轮询间隔，画面无变化时自动增大
+        interval_layout = QHBoxLayout()
+        interval_layout.addWidget(QLabel('轮询间隔:'))
+        self.poll_interval = QDoubleSpinBox()
+        self.poll_interval.setRange(0.01, 5.0)
+        self.poll_interval.setSingleStep(0.05)
+        self.poll_interval.setValue(0.05)
+        self.poll_interval.setSuffix(" 秒")
+        interval_layout.addWidget(self.poll_interval)
+        self.layout.addLayout(interval_layout)
+        
+        self.add_action_buttons()
+        self.setLayout(self.layout)
+        
+    def get_params(self):
+        params = self.get_common_params()
+        params.update({
+            'appear': self.mode.currentIndex() == 0,
+            'timeout': self.timeout.value(),
+            'poll_interval': self.poll_interval.value()
+        })
+        return params
+
 class LoopActionDialog(BaseActionDialog):
     def __init__(self, parent=None):
         super().__init__('添加循环动作', '循环动作将重复执行指定的次数', parent)
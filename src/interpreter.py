@@ -0,0 +1,176 @@
+"""动作解释器
+
+将嵌套的动作树预编译为扁平指令列表，执行时只做一次表驱动分派。
+动作验证在编译时完成，执行循环中不再访问文件系统。
+"""
+import threading
+from typing import Any, Callable, Dict, List, NamedTuple, Optional, Union
+from actions import Action, ActionType
+
+# 指令格式统一为 (操作码, 参数a, 参数b, 参数c)
+OP_CALL = 0     # (OP_CALL, 处理函数, 动作参数, None)
+OP_BEGIN = 1    # (OP_BEGIN, 顶层序号, 动作描述, None)
+OP_END = 2      # (OP_END, 顶层序号, 动作描述, None)
+OP_LOG = 3      # (OP_LOG, 消息, 级别, None)
+OP_LOOP = 4     # (OP_LOOP, 计数槽, 循环次数, 循环结束位置)
+OP_NEXT = 5     # (OP_NEXT, 计数槽, 循环体起始位置, None)
+OP_BRANCH = 6   # (OP_BRANCH, 条件函数, 动作参数, (分支跳转表, 真分支位置, 假分支位置))
+OP_JUMP = 7     # (OP_JUMP, 目标位置, None, None)
+
+ActionLike = Union[Action, Dict[str, Any]]
+
+
+class Program(NamedTuple):
+    """编译后的程序"""
+    code: List[tuple]
+    loop_slots: int
+    total: int
+
+
+def as_action(item: ActionLike) -> Action:
+    """嵌套动作可能是Action对象或从JSON读入的字典"""
+    if isinstance(item, Action):
+        return item
+    return Action.from_dict(item)
+
+
+class Compiler:
+    """将动作树编译为扁平指令列表
+
+    handlers 将动作类型映射到 handler(params)；conditions 将条件类动作映射到
+    condition(params)，返回 None 表示条件不成立，否则返回分支键(可为 True)。
+    LOOP、SEQUENCE、CONDITION 的子动作递归内联，可任意嵌套；提供 parallel 时
+    PARALLEL 的每个子动作单独编译为程序，执行时调用 parallel(programs)。
+    """
+    def __init__(self, handlers: Dict[str, Callable[[dict], Any]], conditions: Dict[str, Callable[[dict], Any]],
+                 parallel: Optional[Callable[[List['Program']], Any]] = None):
+        self.handlers = handlers
+        self.conditions = conditions
+        self.parallel = parallel
+
+    def compile(self, actions: List[ActionLike], start: int = 0, total: Optional[int] = None) -> Program:
+        """编译动作列表，start 为第一个动作的顶层序号，total 为进度计算使用的动作总数"""
+        self._code: List[tuple] = []
+        self._slots = 0
+        for index, item in enumerate(actions, start):
+            action = as_action(item)
+            error = action.validate()
+            if error:
+                self._code.append((OP_LOG, f"动作验证失败: {error}", "error", None))
+                continue
+            self._code.append((OP_BEGIN, index, action.description, None))
+            self._emit(action)
+            self._code.append((OP_END, index, action.description, None))
+        return Program(self._code, self._slots, len(actions) if total is None else total)
+
+    def _emit_block(self, items: List[ActionLike]):
+        for item in items:
+            action = as_action(item)
+            error = action.validate()
+            if error:
+                self._code.append((OP_LOG, f"动作验证失败: {action.description}: {error}", "error", None))
+                continue
+            self._emit(action)
+
+    def _emit(self, action: Action):
+        code = self._code
+        params = action.params
+        if action.type == ActionType.SEQUENCE:
+            self._emit_block(params.get('actions', []))
+        elif action.type == ActionType.LOOP:
+            slot = self._slots
+            self._slots += 1
+            loop_pc = len(code)
+            code.append(None)  # 循环结束位置待回填
+            body_pc = len(code)
+            self._emit_block(params.get('actions', []))
+            code.append((OP_NEXT, slot, body_pc, None))
+            code[loop_pc] = (OP_LOOP, slot, params.get('count', 1), len(code))
+        elif action.type == ActionType.PARALLEL and self.parallel:
+            programs = [Compiler(self.handlers, self.conditions, self.parallel).compile([item])
+                        for item in params.get('actions', [])]
+            code.append((OP_CALL, self.parallel, programs, None))
+        elif action.type in self.conditions:
+            branch_pc = len(code)
+            code.append(None)  # 跳转表待回填
+            jump_pcs = []
+            table = {}
+            for key, items in params.get('branches', {}).items():
+                table[key] = len(code)
+                self._emit_block(items)
+                jump_pcs.append(len(code))
+                code.append(None)
+            true_pc = len(code)
+            self._emit_block(params.get('true_actions', []))
+            jump_pcs.append(len(code))
+            code.append(None)
+            false_pc = len(code)
+            self._emit_block(params.get('false_actions', []))
+            end_pc = len(code)
+            for pc in jump_pcs:
+                code[pc] = (OP_JUMP, end_pc, None, None)
+            code[branch_pc] = (OP_BRANCH, self.conditions[action.type], params, (table, true_pc, false_pc))
+        elif action.type in self.handlers:
+            code.append((OP_CALL, self.handlers[action.type], params, None))
+        else:
+            code.append((OP_LOG, f"不支持的动作类型: {action.type}", "warning", None))
+
+
+class Interpreter:
+    """执行编译后的程序
+
+    on_begin(index, total, description) 和 on_end(index, description) 在每个
+    顶层动作前后调用，stop_event 置位后在下一条指令前退出。
+    """
+    def __init__(self, stop_event: threading.Event,
+                 on_log: Callable[[str, str], None],
+                 on_begin: Optional[Callable[[int, int, str], None]] = None,
+                 on_end: Optional[Callable[[int, str], None]] = None):
+        self.stop_event = stop_event
+        self.on_log = on_log
+        self.on_begin = on_begin
+        self.on_end = on_end
+
+    def run(self, program: Program):
+        code = program.code
+        total = program.total
+        counters = [0] * program.loop_slots
+        stopped = self.stop_event.is_set
+        on_log = self.on_log
+        on_begin = self.on_begin
+        on_end = self.on_end
+        size = len(code)
+        pc = 0
+        while pc < size:
+            if stopped():
+                break
+            op, a, b, c = code[pc]
+            if op == OP_CALL:
+                a(b)
+                pc += 1
+            elif op == OP_NEXT:
+                counters[a] -= 1
+                pc = b if counters[a] > 0 else pc + 1
+            elif op == OP_LOOP:
+                counters[a] = b
+                pc = pc + 1 if b > 0 else c
+            elif op == OP_BRANCH:
+                key = a(b)
+                table, true_pc, false_pc = c
+                if key is None:
+                    pc = false_pc
+                else:
+                    pc = table.get(key, true_pc)
+            elif op == OP_JUMP:
+                pc = a
+            elif op == OP_BEGIN:
+                if on_begin:
+                    on_begin(a, total, b)
+                pc += 1
+            elif op == OP_END:
+                if on_end:
+                    on_end(a, b)
+                pc += 1
+            else:
+                on_log(a, b)
+                pc += 1
@@ -0,0 +1,119 @@
+"""执行日志缓冲
+
+执行线程只把日志记录追加到缓冲区，界面线程按固定间隔批量取出显示，
+避免每条日志都跨线程发送信号。可选同时写入按大小轮转的日志文件，
+文件由单独的写入线程写入，不占用执行线程和界面线程。
+"""
+import os
+import time
+import queue
+import logging
+import threading
+from collections import deque
+from logging.handlers import QueueListener, RotatingFileHandler
+from typing import List, NamedTuple, Optional
+
+
+class LogRecord(NamedTuple):
+    """一条执行日志"""
+    timestamp: float
+    level: str
+    message: str
+
+
+# 引擎日志级别到 logging 级别的映射，success 按 info 记录
+LEVELS = {
+    "info": logging.INFO,
+    "success": logging.INFO,
+    "warning": logging.WARNING,
+    "error": logging.ERROR,
+}
+
+
+def create_file_logger(path: str, max_bytes: int = 5 * 1024 * 1024, backup_count: int = 3) -> logging.Logger:
+    """创建写入轮转日志文件的记录器，同一路径重复调用返回同一个记录器"""
+    path = os.path.abspath(path)
+    logger = logging.getLogger(f"automation.file.{path}")
+    if not logger.handlers:
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        handler = RotatingFileHandler(path, maxBytes=max_bytes, backupCount=backup_count, encoding='utf-8')
+        handler.setFormatter(logging.Formatter("%(asctime)s [%(levelname)s] %(message)s"))
+        logger.addHandler(handler)
+        logger.setLevel(logging.INFO)
+        # 不向根记录器传播，避免重复输出到控制台
+        logger.propagate = False
+    return logger
+
+
+class BufferedLogSink:
+    """线程安全的日志缓冲区
+
+    write 可在任意线程调用，只做一次追加；drain 由消费方定期调用取出全部待显示记录。
+    待显示记录超过 max_pending 时丢弃最旧的记录并计数，保证内存占用有上限。
+    设置了 file_logger 时记录同时放入队列，由单独的写入线程写入文件，
+    执行线程和界面线程都不做磁盘读写，显示丢弃的记录也会写入文件。
+    """
+    DEFAULT_MAX_PENDING = 10000
+
+    def __init__(self, max_pending: int = DEFAULT_MAX_PENDING, file_logger: Optional[logging.Logger] = None):
+        self._pending: deque = deque()
+        self._lock = threading.Lock()
+        self.max_pending = max_pending
+        self.file_logger: Optional[logging.Logger] = None
+        self._file_queue: Optional[queue.SimpleQueue] = None
+        self._listener: Optional[QueueListener] = None
+        self.written = 0
+        self.dropped = 0
+        self.set_file_logger(file_logger)
+
+    def set_file_logger(self, file_logger: Optional[logging.Logger]):
+        """更换或关闭日志文件，原来的写入线程写完已排队的记录后退出"""
+        with self._lock:
+            listener = self._listener
+            self.file_logger = file_logger
+            self._file_queue = queue.SimpleQueue() if file_logger is not None else None
+            self._listener = (QueueListener(self._file_queue, *file_logger.handlers)
+                              if file_logger is not None else None)
+            if self._listener is not None:
+                self._listener.start()
+        if listener is not None:
+            listener.stop()
+
+    def close(self):
+        """停止文件写入线程，已排队的记录写完后返回"""
+        self.set_file_logger(None)
+
+    def write(self, message: str, level: str = "info"):
+        record = LogRecord(time.time(), level, message)
+        with self._lock:
+            self._pending.append(record)
+            self.written += 1
+            if len(self._pending) > self.max_pending:
+                self._pending.popleft()
+                self.dropped += 1
+            logger, file_queue = self.file_logger, self._file_queue
+        if file_queue is not None:
+            entry = logger.makeRecord(logger.name, LEVELS.get(level, logging.INFO), "", 0, message, None, None)
+            entry.created = record.timestamp
+            entry.msecs = (record.timestamp - int(record.timestamp)) * 1000
+            file_queue.put(entry)
+
+    def drain(self) -> List[LogRecord]:
+        """取出并清空全部待显示记录"""
+        with self._lock:
+            records = list(self._pending)
+            self._pending.clear()
+        return records
+
+    def take_dropped(self) -> int:
+        """返回上次调用以来丢弃的记录数并清零"""
+        with self._lock:
+            dropped = self.dropped
+            self.dropped = 0
+        return dropped
+
+    def __len__(self) -> int:
+        with self._lock:
+            return len(self._pending)
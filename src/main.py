@@ -1,11 +1,40 @@
 import os
 import sys
+import time
+import threading
+import multiprocessing
+from contextlib import contextmanager
 from ctypes import windll
 from PyQt5.QtWidgets import QApplication
 from PyQt5.QtCore import Qt, QTimer
-from PyQt5.QtGui import QIcon, QMovie
-from gui import AutomationWindow, SplashScreen
-progress = 0
+from PyQt5.QtGui import QIcon
+
+
+class StartupProfiler:
+    """记录启动各阶段耗时(毫秒)，用于跟踪启动性能回退"""
+    def __init__(self):
+        self.origin = time.perf_counter()
+        self.stages = []
+        self._lock = threading.Lock()
+
+    @contextmanager
+    def stage(self, name: str):
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            with self._lock:
+                self.stages.append((name, (time.perf_counter() - start) * 1000))
+
+    def report(self) -> str:
+        with self._lock:
+            lines = [f"  {name}: {elapsed:.1f} ms" for name, elapsed in self.stages]
+        total = (time.perf_counter() - self.origin) * 1000
+        return "启动耗时:\n" + "\n".join(lines) + f"\n  总计: {total:.1f} ms"
+
+
+profiler = StartupProfiler()
+
 def set_dpi_awareness():
     """设置Windows DPI感知"""
     try:
@@ -30,7 +59,19 @@ def enable_high_dpi_support():
     except Exception as e:
         print(f"DPI设置警告: {e}")
 
+def preload_engine():
+    """后台预加载识别引擎(cv2、numpy)，首次执行流程时无需再等待导入"""
+    with profiler.stage("预加载识别引擎"):
+        try:
+            import automation
+        except Exception as e:
+            print(f"识别引擎预加载失败: {e}")
+    print(profiler.report())
+
+
 if __name__ == '__main__':
+    # 打包后的程序需要此调用才能启动匹配进程池的工作进程
+    multiprocessing.freeze_support()
     try:
         # 在创建QApplication之前设置高DPI属性
         QApplication.setAttribute(Qt.AA_EnableHighDpiScaling, True)
@@ -38,33 +79,32 @@ if __name__ == '__main__':
         
         enable_high_dpi_support()
         
-        app = QApplication(sys.argv)
+        with profiler.stage("加载界面模块"):
+            from gui import AutomationWindow, SplashScreen
+        
+        with profiler.stage("创建应用"):
+            app = QApplication(sys.argv)
         
         # 创建启动画面
-        splash = SplashScreen()
-        splash.show()
+        with profiler.stage("显示启动画面"):
+            splash = SplashScreen()
+            splash.show()
+            splash.set_progress(30, "正在创建主窗口...")
+            app.processEvents()
         
-        # 模拟加载过程
-        timer = QTimer()
+        with profiler.stage("创建主窗口"):
+            window = AutomationWindow()
+            splash.set_progress(90, "正在准备界面...")
+            app.processEvents()
         
-        def update_progress():
-            global progress
-            progress += 25  # 增加每次进度的增量
-            splash.set_progress(progress)
-            if progress >= 100:
-                timer.stop()
-                # 创建主窗口
-                window = AutomationWindow()
-                # 显示主窗口
-                window.show()
-                # 延迟关闭启动画面，不使用finish方法
-                QTimer.singleShot(100, splash.close)
-                # 保持对主窗口的引用
-                app.main_window = window
-
-        # 每300毫秒更新一次进度，加快加载速度
-        timer.timeout.connect(update_progress)
-        timer.start(300)
+        # 主窗口可用后立即显示，识别引擎在后台加载
+        with profiler.stage("显示主窗口"):
+            window.show()
+            splash.set_progress(100, "即将完成...")
+            QTimer.singleShot(100, splash.close)
+            # 保持对主窗口的引用
+            app.main_window = window
+        threading.Thread(target=preload_engine, name="preload", daemon=True).start()
                 
         # 设置应用程序图标
         app.setWindowIcon(QIcon('icon.ico'))
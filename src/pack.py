@@ -0,0 +1,194 @@
+"""流程包
+
+将流程及其引用的全部模板(解码后的彩色原图及灰度等预先转换的版本)打包为单个二进制文件。
+载入时整个文件以内存映射方式打开，模板直接作为只读数组固定到模板缓存，
+执行期间不再读取任何模板文件；流程在打包时验证一次。
+
+    python -m pack workflow.json -o workflow.xmpack
+
+文件结构：16字节文件头(魔数、版本、JSON头长度)，UTF-8 JSON头，按64字节对齐的数组数据。
+JSON头描述每个数组的偏移、形状和数据类型，容器格式与具体内容无关，可用于其他数据。
+"""
+import os
+import sys
+import json
+import struct
+import argparse
+from typing import Any, Dict, Iterable, List, Optional, Tuple
+import numpy as np
+from actions import Action, ColorMode, register_resident_templates
+
+MAGIC = b"XMPK"
+FORMAT_VERSION = 1
+# 魔数、版本、保留、JSON头长度
+FILE_HEADER = struct.Struct('<4sHHQ')
+ALIGNMENT = 64
+PACK_EXTENSION = '.xmpack'
+
+
+def _align(offset: int) -> int:
+    return (offset + ALIGNMENT - 1) // ALIGNMENT * ALIGNMENT
+
+
+def write_container(path: str, header: Dict[str, Any], arrays: List[np.ndarray]):
+    """写入容器文件，header['arrays'] 记录每个数组相对数据区起点的偏移、形状和类型"""
+    entries = []
+    offset = 0
+    for array in arrays:
+        offset = _align(offset)
+        entries.append({'offset': offset, 'shape': list(array.shape), 'dtype': array.dtype.str})
+        offset += array.nbytes
+    header = dict(header, arrays=entries)
+    header_bytes = json.dumps(header, ensure_ascii=False).encode('utf-8')
+    data_start = _align(FILE_HEADER.size + len(header_bytes))
+
+    tmp_path = path + '.tmp'
+    with open(tmp_path, 'wb') as f:
+        f.write(FILE_HEADER.pack(MAGIC, FORMAT_VERSION, 0, len(header_bytes)))
+        f.write(header_bytes)
+        for entry, array in zip(entries, arrays):
+            f.seek(data_start + entry['offset'])
+            f.write(np.ascontiguousarray(array).tobytes())
+        # 文件末尾补齐，保证最后一个数组的映射范围完整
+        f.truncate(data_start + offset)
+    os.replace(tmp_path, path)
+
+
+def is_container(path: str) -> bool:
+    """检查文件是否为容器格式"""
+    try:
+        with open(path, 'rb') as f:
+            return f.read(len(MAGIC)) == MAGIC
+    except OSError:
+        return False
+
+
+def read_container(path: str) -> Tuple[Dict[str, Any], List[np.ndarray]]:
+    """以内存映射方式打开容器，返回JSON头和只读数组视图，数组在使用时才按页读入"""
+    with open(path, 'rb') as f:
+        magic, version, _, header_size = FILE_HEADER.unpack(f.read(FILE_HEADER.size))
+        if magic != MAGIC:
+            raise ValueError(f"无法识别的文件格式: {path}")
+        if version > FORMAT_VERSION:
+            raise ValueError(f"文件格式版本 {version} 高于当前支持的版本 {FORMAT_VERSION}")
+        header = json.loads(f.read(header_size).decode('utf-8'))
+    data_start = _align(FILE_HEADER.size + header_size)
+    entries = header.get('arrays', [])
+    if not entries:
+        return header, []
+    mapped = np.memmap(path, dtype=np.uint8, mode='r')
+    arrays = []
+    for entry in entries:
+        dtype = np.dtype(entry['dtype'])
+        count = int(np.prod(entry['shape'])) * dtype.itemsize
+        start = data_start + entry['offset']
+        arrays.append(mapped[start:start + count].view(dtype).reshape(entry['shape']))
+    return header, arrays
+
+
+def iter_actions(items: Iterable) -> Iterable[Action]:
+    """递归遍历动作及其全部子动作"""
+    for item in items:
+        action = item if isinstance(item, Action) else Action.from_dict(item)
+        yield action
+        params = action.params
+        yield from iter_actions(params.get('actions', []))
+        yield from iter_actions(params.get('true_actions', []))
+        yield from iter_actions(params.get('false_actions', []))
+        for branch in params.get('branches', {}).values():
+            yield from iter_actions(branch)
+
+
+def collect_variants(actions: List[Action], modes: Iterable[str] = (ColorMode.GRAY,)) -> Dict[str, set]:
+    """收集每个模板需要预先生成的 (颜色模式, 缩放比例) 版本"""
+    from engine import ImageMatcher
+    variants: Dict[str, set] = {}
+    for action in iter_actions(actions):
+        params = action.params
+        paths = list(params.get('template_paths', []))
+        if 'template_path' in params:
+            paths.append(params['template_path'])
+        if not paths:
+            continue
+        color_mode = params.get('color_mode', ColorMode.BGR)
+        scales = params.get('scales') or (ImageMatcher.DEFAULT_SCALES if params.get('multi_scale') else (1.0,))
+        for path in paths:
+            wanted = variants.setdefault(path, {(ColorMode.BGR, 1.0)})
+            wanted.update((mode, 1.0) for mode in modes)
+            wanted.update((color_mode, round(float(scale), 4)) for scale in scales)
+    return variants
+
+
+def write_pack(path: str, actions: List[Action], settings: Optional[Dict[str, Any]] = None,
+               modes: Iterable[str] = (ColorMode.GRAY,)):
+    """验证流程并将其与全部模板版本写入流程包，验证失败时抛出 ValueError"""
+    from template_cache import template_cache
+    for action in iter_actions(actions):
+        error = action.validate()
+        if error:
+            raise ValueError(f"{action.description}: {error}")
+
+    assets = []
+    arrays = []
+    for template_path, wanted in sorted(collect_variants(actions, modes).items()):
+        asset = {'path': template_path, 'variants': []}
+        for mode, scale in sorted(wanted):
+            entry = template_cache.get_entry(template_path, mode, scale)
+            if entry is None:
+                # 缩放后过小的版本跳过，执行时同样不会使用
+                continue
+            asset['variants'].append({'mode': mode, 'scale': scale, 'array': len(arrays), 'norm': entry.norm})
+            arrays.append(entry.image)
+        assets.append(asset)
+
+    header = {
+        'kind': 'workflow',
+        'actions': [action.to_dict() for action in actions],
+        'settings': settings or {},
+        'assets': assets,
+    }
+    write_container(path, header, arrays)
+
+
+def load_pack(path: str) -> Tuple[List[Action], Dict[str, Any]]:
+    """载入流程包：固定全部模板到模板缓存并登记为已驻留，返回动作列表和流程设置"""
+    from template_cache import template_cache
+    from workflow_io import DEFAULT_SETTINGS
+    header, arrays = read_container(path)
+    if header.get('kind') != 'workflow':
+        raise ValueError(f"不是流程包文件: {path}")
+    for asset in header['assets']:
+        for variant in asset['variants']:
+            template_cache.preload(asset['path'], arrays[variant['array']], variant['mode'], variant['scale'],
+                                   variant.get('norm'))
+    template_cache.add_source(path)
+    register_resident_templates(asset['path'] for asset in header['assets'])
+    settings = dict(DEFAULT_SETTINGS)
+    settings.update(header.get('settings', {}))
+    return [Action.from_dict(item) for item in header['actions']], settings
+
+
+def main(argv: Optional[list] = None) -> int:
+    parser = argparse.ArgumentParser(prog="pack", description="将流程及其模板打包为流程包")
+    parser.add_argument('workflow', help="流程JSON文件")
+    parser.add_argument('-o', '--output', help=f"输出文件，默认与流程同名、扩展名为 {PACK_EXTENSION}")
+    parser.add_argument('--modes', nargs='*', choices=ColorMode.ALL, default=[ColorMode.GRAY],
+                        help="为每个模板额外预先生成的颜色模式")
+    args = parser.parse_args(argv)
+
+    from workflow_io import read_workflow
+    actions, settings = read_workflow(args.workflow)
+    output = args.output or os.path.splitext(args.workflow)[0] + PACK_EXTENSION
+    try:
+        write_pack(output, actions, settings, args.modes)
+    except ValueError as e:
+        print(f"打包失败: {e}", file=sys.stderr)
+        return 1
+    header, arrays = read_container(output)
+    print(f"已写入 {output}: {len(header['actions'])} 个动作, {len(header['assets'])} 个模板, "
+          f"{len(arrays)} 个版本, {os.path.getsize(output) / 1024:.1f} KB")
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,198 @@
+"""多进程匹配后端
+
+将模板匹配分发到进程池，绕过单个执行线程只能使用一个核心的限制：
+多个模板按模板分发，多尺度搜索按缩放比例分发，单个模板的整幅搜索按行分段计算得分图。
+截取的画面和得分图放在共享内存中，各工作进程按名称映射，不对整幅画面做序列化；
+工作进程常驻并各自保留模板缓存，动作之间无需重新启动或重新解码模板。
+"""
+import os
+import atexit
+import threading
+from concurrent.futures import ProcessPoolExecutor, wait
+from multiprocessing import shared_memory
+from typing import List, Optional, Sequence, Tuple
+import numpy as np
+
+# (共享内存名称, 形状, 数据类型)
+FrameRef = Tuple[str, Tuple[int, ...], str]
+
+# 工作进程内的匹配器，由 _init_worker 创建
+_worker_matcher = None
+# 工作进程已挂载的流程包和模板库
+_worker_sources = set()
+
+
+def _init_worker():
+    """工作进程初始化：导入OpenCV并创建只用于匹配的匹配器"""
+    global _worker_matcher
+    from engine import ImageMatcher
+    from screen import ScreenSource
+    # 工作进程只处理共享画面，不截屏；各进程看到的模板不同，不使用区域记忆
+    _worker_matcher = ImageMatcher(ScreenSource(), roi_memory=False)
+
+
+def _ping() -> int:
+    return os.getpid()
+
+
+def _attach_sources(sources: Sequence[str]):
+    """挂载主进程中常驻模板来自的文件，与主进程映射同一份物理内存页"""
+    from template_store import attach_file
+    for path in sources:
+        if path not in _worker_sources:
+            attach_file(path)
+            _worker_sources.add(path)
+
+
+def _open(ref: FrameRef) -> Tuple[shared_memory.SharedMemory, np.ndarray]:
+    """映射共享内存中的数组，调用方释放数组引用后关闭映射"""
+    name, shape, dtype = ref
+    shm = shared_memory.SharedMemory(name=name)
+    return shm, np.ndarray(shape, dtype=np.dtype(dtype), buffer=shm.buf)
+
+
+def _match_job(frame_ref: FrameRef, template_path: str, threshold: float, region, pyramid: int,
+               color_mode: str, scales: Optional[Sequence[float]], sources: Sequence[str] = ()):
+    """在共享内存中的画面上匹配单个模板"""
+    _attach_sources(sources)
+    shm, frame = _open(frame_ref)
+    try:
+        return _worker_matcher._match_converted(frame, template_path, threshold, region, pyramid, color_mode, scales)
+    finally:
+        # 释放对共享内存缓冲区的引用后才能关闭
+        frame = None
+        shm.close()
+
+
+def _score_job(frame_ref: FrameRef, scores_ref: FrameRef, template: np.ndarray, y0: int, y1: int):
+    """计算得分图的第 y0 至 y1 行，只需画面的第 y0 至 y1 + 模板高度 - 1 行"""
+    import cv2
+    frame_shm, frame = _open(frame_ref)
+    scores_shm, scores = _open(scores_ref)
+    try:
+        scores[y0:y1] = cv2.matchTemplate(frame[y0:y1 + template.shape[0] - 1], template, cv2.TM_CCOEFF_NORMED)
+    finally:
+        frame = scores = None
+        frame_shm.close()
+        scores_shm.close()
+
+
+class SharedFrame:
+    """将画面拷贝到共享内存，退出 with 块时释放"""
+    def __init__(self, frame: np.ndarray):
+        frame = np.ascontiguousarray(frame)
+        self._shm = shared_memory.SharedMemory(create=True, size=max(frame.nbytes, 1))
+        self.array = np.ndarray(frame.shape, dtype=frame.dtype, buffer=self._shm.buf)
+        self.array[...] = frame
+        self.ref: FrameRef = (self._shm.name, frame.shape, frame.dtype.str)
+
+    @classmethod
+    def empty(cls, shape: Tuple[int, ...], dtype=np.float32) -> 'SharedFrame':
+        """分配未初始化的共享数组，用于接收工作进程的计算结果"""
+        shared = cls.__new__(cls)
+        dtype = np.dtype(dtype)
+        shared._shm = shared_memory.SharedMemory(create=True, size=max(int(np.prod(shape)) * dtype.itemsize, 1))
+        shared.array = np.ndarray(shape, dtype=dtype, buffer=shared._shm.buf)
+        shared.ref = (shared._shm.name, tuple(shape), dtype.str)
+        return shared
+
+    def __enter__(self) -> 'SharedFrame':
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.array = None
+        self._shm.close()
+        self._shm.unlink()
+
+
+class ProcessMatchBackend:
+    """常驻进程池，按模板、缩放比例或画面行段分发匹配任务"""
+    # 按行分段时每段至少包含的得分图行数，过短的分段调度开销超过计算量
+    MIN_BAND_ROWS = 64
+
+    def __init__(self, max_workers: Optional[int] = None):
+        self.max_workers = max_workers or os.cpu_count() or 4
+        self._pool: Optional[ProcessPoolExecutor] = None
+        self._lock = threading.Lock()
+
+    def _get_pool(self) -> ProcessPoolExecutor:
+        with self._lock:
+            if self._pool is None:
+                if os.name == 'posix':
+                    # 先启动资源跟踪进程，工作进程继承同一个，映射共享内存时不会被重复登记为泄漏
+                    from multiprocessing import resource_tracker
+                    resource_tracker.ensure_running()
+                self._pool = ProcessPoolExecutor(max_workers=self.max_workers, initializer=_init_worker)
+            return self._pool
+
+    def warm(self):
+        """启动全部工作进程并完成初始化，避免第一次匹配承担进程启动开销"""
+        pool = self._get_pool()
+        for future in [pool.submit(_ping) for _ in range(self.max_workers)]:
+            future.result()
+
+    def match_many(self, screenshot: np.ndarray, template_paths: List[str], threshold: float, region,
+                   pyramid: int, color_mode: str, scales: Optional[Sequence[float]]) -> list:
+        """在已转换颜色的画面上并行匹配多个模板，结果顺序与 template_paths 一致"""
+        from template_cache import template_cache
+        pool = self._get_pool()
+        sources = template_cache.sources()
+        with SharedFrame(screenshot) as frame:
+            futures = [pool.submit(_match_job, frame.ref, path, threshold, region, pyramid, color_mode,
+                                   list(scales) if scales else None, sources)
+                       for path in template_paths]
+            # 全部任务结束后才能释放共享内存，包括出错的情况
+            wait(futures)
+            return [future.result() for future in futures]
+
+    def match_scales(self, screenshot: np.ndarray, template_path: str, threshold: float, region,
+                     pyramid: int, color_mode: str, scales: Sequence[float]) -> list:
+        """在已转换颜色的画面上并行尝试单个模板的多个缩放比例，每个比例一个任务，结果顺序与 scales 一致"""
+        from template_cache import template_cache
+        pool = self._get_pool()
+        sources = template_cache.sources()
+        with SharedFrame(screenshot) as frame:
+            futures = [pool.submit(_match_job, frame.ref, template_path, threshold, region, pyramid, color_mode,
+                                   [scale], sources)
+                       for scale in scales]
+            wait(futures)
+            return [future.result() for future in futures]
+
+    def score_map(self, screenshot: np.ndarray, template: np.ndarray) -> np.ndarray:
+        """计算与 cv2.matchTemplate(TM_CCOEFF_NORMED) 相同的得分图，按行分段在各工作进程中计算
+
+        相邻分段的画面重叠模板高度减一行，各段得分图互不重叠，拼接后与整幅计算的结果一致。
+        """
+        h, w = template.shape[:2]
+        rows, cols = screenshot.shape[0] - h + 1, screenshot.shape[1] - w + 1
+        bands = max(min(self.max_workers, rows // self.MIN_BAND_ROWS), 1)
+        bounds = [rows * i // bands for i in range(bands + 1)]
+        pool = self._get_pool()
+        template = np.ascontiguousarray(template)
+        with SharedFrame(screenshot) as frame, SharedFrame.empty((rows, cols)) as scores:
+            futures = [pool.submit(_score_job, frame.ref, scores.ref, template, y0, y1)
+                       for y0, y1 in zip(bounds, bounds[1:])]
+            wait(futures)
+            for future in futures:
+                future.result()
+            return scores.array.copy()
+
+    def shutdown(self):
+        with self._lock:
+            if self._pool is not None:
+                self._pool.shutdown(wait=True, cancel_futures=True)
+                self._pool = None
+
+
+_backend: Optional[ProcessMatchBackend] = None
+_backend_lock = threading.Lock()
+
+
+def get_process_backend() -> ProcessMatchBackend:
+    """获取共享的进程池后端，进程池在整个会话中保持运行"""
+    global _backend
+    with _backend_lock:
+        if _backend is None:
+            _backend = ProcessMatchBackend()
+            atexit.register(_backend.shutdown)
+        return _backend
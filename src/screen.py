@@ -0,0 +1,125 @@
+import os
+import sys
+import time
+import threading
+from typing import List, Optional, Tuple
+import cv2
+import numpy as np
+
+Region = Tuple[int, int, int, int]
+
+
+def crop_region(frame: np.ndarray, region: Optional[Region]) -> np.ndarray:
+    """按 (x, y, 宽, 高) 裁剪画面，返回视图而非拷贝"""
+    if not region:
+        return frame
+    x, y, w, h = region
+    return frame[max(y, 0):y + h, max(x, 0):x + w]
+
+
+def display_scale() -> float:
+    """返回主显示器的缩放比例(1.0 对应 96 DPI)，无法获取时返回1.0
+
+    进程已声明DPI感知时截图为物理像素，按100%缩放截取的模板需要放大此倍数。
+    """
+    if sys.platform == 'win32':
+        try:
+            import ctypes
+            return ctypes.windll.user32.GetDpiForSystem() / 96.0
+        except (AttributeError, OSError):
+            pass
+    try:
+        return float(os.environ.get('QT_SCALE_FACTOR', 1.0)) or 1.0
+    except ValueError:
+        return 1.0
+
+
+class ScreenSource:
+    """屏幕画面来源基类，grab 返回BGR格式的画面"""
+    def grab(self, region: Optional[Region] = None) -> np.ndarray:
+        raise NotImplementedError
+
+    def invalidate(self):
+        """丢弃缓存的画面，输入事件之后调用"""
+        pass
+
+
+class PyAutoGUIScreenSource(ScreenSource):
+    """通过pyautogui截取实际桌面"""
+    def grab(self, region: Optional[Region] = None) -> np.ndarray:
+        import pyautogui
+        screenshot = pyautogui.screenshot(region=region)
+        return cv2.cvtColor(np.array(screenshot), cv2.COLOR_RGB2BGR)
+
+
+class ReplayScreenSource(ScreenSource):
+    """按顺序回放内存中的画面，每次截图前进一帧，用于离线测试和基准"""
+    def __init__(self, frames: List[np.ndarray], loop: bool = False):
+        if not frames:
+            raise ValueError("回放画面列表为空")
+        self.frames = frames
+        self.loop = loop
+        self.index = 0
+        self._lock = threading.Lock()
+
+    def grab(self, region: Optional[Region] = None) -> np.ndarray:
+        with self._lock:
+            frame = self.frames[self.index]
+            if self.index + 1 < len(self.frames):
+                self.index += 1
+            elif self.loop:
+                self.index = 0
+        return crop_region(frame, region)
+
+
+class FileScreenSource(ReplayScreenSource):
+    """从PNG文件或目录回放画面，目录中的图像按文件名排序"""
+    IMAGE_EXTENSIONS = ('.png', '.jpg', '.bmp')
+
+    def __init__(self, path: str, loop: bool = False):
+        if os.path.isdir(path):
+            files = sorted(
+                os.path.join(path, name) for name in os.listdir(path)
+                if name.lower().endswith(self.IMAGE_EXTENSIONS)
+            )
+        else:
+            files = [path]
+        frames = []
+        for file in files:
+            frame = cv2.imread(file)
+            if frame is None:
+                raise ValueError(f"无法读取画面文件: {file}")
+            frames.append(frame)
+        super().__init__(frames, loop)
+
+
+class CachedScreenSource(ScreenSource):
+    """帧共享缓存：在有效期内重复使用上一次截取的整屏画面
+
+    带区域的请求从缓存的整屏画面中裁剪，因此同一时刻的多次匹配只截一次屏。
+    """
+    def __init__(self, source: ScreenSource, max_age: float = 0.03):
+        self.source = source
+        self.max_age = max_age
+        self._frame: Optional[np.ndarray] = None
+        self._timestamp = 0.0
+        self._lock = threading.Lock()
+        self.captures = 0
+        self.reuses = 0
+
+    def grab(self, region: Optional[Region] = None) -> np.ndarray:
+        with self._lock:
+            now = time.perf_counter()
+            if self._frame is None or now - self._timestamp > self.max_age:
+                self._frame = self.source.grab()
+                self._timestamp = time.perf_counter()
+                self.captures += 1
+            else:
+                self.reuses += 1
+            frame = self._frame
+        return crop_region(frame, region)
+
+    def invalidate(self):
+        with self._lock:
+            self._frame = None
+        self.source.invalidate()
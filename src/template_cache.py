@@ -0,0 +1,278 @@
+import os
+import threading
+from collections import OrderedDict
+from typing import Dict, List, Optional, Tuple
+import cv2
+import numpy as np
+from actions import ColorMode
+
+# 单通道模式对应的BGR通道序号
+CHANNEL_INDEX = {ColorMode.BLUE: 0, ColorMode.GREEN: 1, ColorMode.RED: 2}
+
+
+def convert_color(image: np.ndarray, mode: str) -> np.ndarray:
+    """将BGR图像转换为指定颜色模式，模板与画面使用同一函数保证一致"""
+    if mode == ColorMode.BGR:
+        return image
+    if mode == ColorMode.GRAY:
+        return cv2.cvtColor(image, cv2.COLOR_BGR2GRAY)
+    if mode in CHANNEL_INDEX:
+        # 拷贝为连续内存，matchTemplate 对连续数组更快
+        return np.ascontiguousarray(image[:, :, CHANNEL_INDEX[mode]])
+    if mode == ColorMode.EDGE:
+        return cv2.Canny(cv2.cvtColor(image, cv2.COLOR_BGR2GRAY), 50, 150)
+    raise ValueError(f"不支持的颜色模式: {mode}")
+
+
+class CachedTemplate:
+    """转换后的模板及预先计算的统计量
+
+    centered 为减去各通道均值后的浮点模板，norm 为其二范数，
+    与 TM_CCOEFF_NORMED 的定义一致，可直接计算单个位置的得分。
+    已知 norm 的条目(如模板库中的模板)在首次需要时才计算 centered，不额外占用内存。
+    """
+    __slots__ = ('image', 'norm', '_centered')
+
+    def __init__(self, image: np.ndarray, centered: Optional[np.ndarray], norm: float):
+        self.image = image
+        self.norm = norm
+        self._centered = centered
+
+    @property
+    def centered(self) -> np.ndarray:
+        if self._centered is None:
+            self._centered = _center(self.image)
+        return self._centered
+
+    @property
+    def nbytes(self) -> int:
+        return self.image.nbytes + (self._centered.nbytes if self._centered is not None else 0)
+
+    def score_at(self, window: np.ndarray) -> float:
+        """计算模板与同尺寸画面窗口的归一化相关系数"""
+        window = window.astype(np.float32)
+        window -= window.mean(axis=(0, 1))
+        denominator = float(np.linalg.norm(window)) * self.norm
+        if denominator == 0.0:
+            return 0.0
+        return float(np.dot(window.ravel(), self.centered.ravel())) / denominator
+
+
+def _center(image: np.ndarray) -> np.ndarray:
+    centered = image.astype(np.float32)
+    centered -= centered.mean(axis=(0, 1))
+    return centered
+
+
+def build_entry(image: np.ndarray, norm: Optional[float] = None) -> CachedTemplate:
+    """构建缓存条目，给定 norm 时延后计算 centered"""
+    if norm is not None:
+        return CachedTemplate(image, None, norm)
+    centered = _center(image)
+    return CachedTemplate(image, centered, float(np.linalg.norm(centered)))
+
+
+class TemplateCache:
+    """进程级模板图像缓存
+
+    以 (路径, mtime, 文件大小, 颜色模式, 缩放比例) 为键缓存解码并转换后的模板，
+    文件被修改后自动失效；缓存总字节数超过预算时按最近最少使用(LRU)顺序淘汰。
+
+    preload 载入的固定条目(如流程包中内存映射的模板)和已挂载模板库中的模板常驻内存，
+    不检查文件、不计入预算也不会被淘汰；原图常驻的模板，其他颜色模式和缩放比例由原图派生，
+    同样不访问文件。
+    """
+    DEFAULT_MAX_BYTES = 256 * 1024 * 1024
+
+    def __init__(self, max_bytes: int = DEFAULT_MAX_BYTES):
+        self.max_bytes = max_bytes
+        self._entries: 'OrderedDict[Tuple, CachedTemplate]' = OrderedDict()
+        self._current_keys: Dict[Tuple[str, str, float], Tuple] = {}
+        self._bytes = 0
+        self._pinned: Dict[Tuple[str, str, float], CachedTemplate] = {}
+        self._stores: list = []
+        # 常驻模板来自的流程包和模板库文件，供工作进程重新挂载
+        self._sources: List[str] = []
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def get(self, template_path: str, mode: str = ColorMode.BGR, scale: float = 1.0) -> Optional[np.ndarray]:
+        """获取解码后的模板图像，文件不存在或无法解码时返回None
+
+        返回的数组为缓存共享对象，调用方不应原地修改。
+        """
+        entry = self.get_entry(template_path, mode, scale)
+        return entry.image if entry is not None else None
+
+    def get_entry(self, template_path: str, mode: str = ColorMode.BGR, scale: float = 1.0) -> Optional[CachedTemplate]:
+        """获取转换(及缩放)后的模板及其统计量，缩放后过小时返回None"""
+        path = os.path.abspath(template_path)
+        scale = round(float(scale), 4)
+        with self._lock:
+            entry = self._resident(path, mode, scale)
+            if entry is not None:
+                self.hits += 1
+                return entry
+            resident_source = self._resident(path, ColorMode.BGR, 1.0) is not None
+        if resident_source:
+            # 原图常驻内存，派生版本以固定的伪版本号为键
+            key = (path, -1, -1, mode, scale)
+        else:
+            try:
+                stat = os.stat(template_path)
+            except OSError:
+                return None
+            key = (path, stat.st_mtime_ns, stat.st_size, mode, scale)
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None:
+                self._entries.move_to_end(key)
+                self.hits += 1
+                return entry
+            self.misses += 1
+
+        image = self._decode(template_path, mode, scale)
+        if image is None:
+            return None
+        entry = build_entry(image)
+
+        with self._lock:
+            # 同一文件的旧版本已失效，直接丢弃
+            stale_key = self._current_keys.get((path, mode, scale))
+            if stale_key is not None and stale_key != key:
+                self._discard(stale_key)
+            if key not in self._entries:
+                self._entries[key] = entry
+                self._bytes += entry.nbytes
+                self._current_keys[(path, mode, scale)] = key
+            self._evict()
+        return entry
+
+    # 缩放后模板最短边下限，过小的模板匹配结果没有意义
+    MIN_SCALED_SIDE = 4
+
+    def _decode(self, template_path: str, mode: str, scale: float) -> Optional[np.ndarray]:
+        """解码模板，其他颜色模式和缩放比例优先由已缓存的彩色原图转换
+
+        先缩放再转换颜色，边缘模式在缩放后的图像上提取边缘。
+        """
+        if mode != ColorMode.BGR:
+            color = self.get(template_path, ColorMode.BGR, scale)
+            if color is None:
+                return None
+            return convert_color(color, mode)
+        if scale != 1.0:
+            original = self.get(template_path, ColorMode.BGR)
+            if original is None:
+                return None
+            h, w = original.shape[:2]
+            size = (int(round(w * scale)), int(round(h * scale)))
+            if min(size) < self.MIN_SCALED_SIDE:
+                return None
+            interpolation = cv2.INTER_AREA if scale < 1.0 else cv2.INTER_LINEAR
+            return cv2.resize(original, size, interpolation=interpolation)
+        return cv2.imread(template_path)
+
+    def _discard(self, key: Tuple):
+        entry = self._entries.pop(key, None)
+        if entry is not None:
+            self._bytes -= entry.nbytes
+
+    def _evict(self):
+        """淘汰最久未使用的条目直到满足字节预算，至少保留最新的一项"""
+        while self._bytes > self.max_bytes and len(self._entries) > 1:
+            key, entry = self._entries.popitem(last=False)
+            self._bytes -= entry.nbytes
+            path_key = (key[0], key[3], key[4])
+            if self._current_keys.get(path_key) == key:
+                del self._current_keys[path_key]
+            self.evictions += 1
+
+    def _resident(self, path: str, mode: str, scale: float) -> Optional[CachedTemplate]:
+        """查找常驻条目，调用方需持有锁"""
+        entry = self._pinned.get((path, mode, scale))
+        if entry is None:
+            for store in self._stores:
+                entry = store.lookup(path, mode, scale)
+                if entry is not None:
+                    break
+        return entry
+
+    def preload(self, template_path: str, image: np.ndarray, mode: str = ColorMode.BGR, scale: float = 1.0,
+                norm: Optional[float] = None):
+        """固定一个已解码的模板版本，image 可以是内存映射的只读数组"""
+        entry = build_entry(image, norm)
+        with self._lock:
+            self._pinned[(os.path.abspath(template_path), mode, round(float(scale), 4))] = entry
+
+    def attach_store(self, store):
+        """挂载模板库，库中模板优先于模板文件使用"""
+        with self._lock:
+            if store not in self._stores:
+                self._stores.append(store)
+                self.add_source(store.path)
+
+    def detach_store(self, store):
+        with self._lock:
+            if store in self._stores:
+                self._stores.remove(store)
+                self._sources.remove(store.path)
+
+    def add_source(self, path: str):
+        """登记常驻模板来自的文件"""
+        path = os.path.abspath(path)
+        if path not in self._sources:
+            self._sources.append(path)
+
+    def sources(self) -> Tuple[str, ...]:
+        with self._lock:
+            return tuple(self._sources)
+
+    def is_resident(self, template_path: str) -> bool:
+        """模板原图是否常驻内存(已固定或来自已挂载的模板库)"""
+        with self._lock:
+            return self._resident(os.path.abspath(template_path), ColorMode.BGR, 1.0) is not None
+
+    def unpin(self, template_paths=None):
+        """解除固定，未指定路径时解除全部"""
+        with self._lock:
+            if template_paths is None:
+                self._pinned.clear()
+                self._sources = [store.path for store in self._stores]
+                return
+            paths = {os.path.abspath(path) for path in template_paths}
+            for key in [key for key in self._pinned if key[0] in paths]:
+                del self._pinned[key]
+
+    def set_max_bytes(self, max_bytes: int):
+        """调整字节预算，超出部分立即淘汰"""
+        with self._lock:
+            self.max_bytes = max_bytes
+            self._evict()
+
+    def clear(self):
+        """清空缓存(固定条目除外)"""
+        with self._lock:
+            self._entries.clear()
+            self._current_keys.clear()
+            self._bytes = 0
+
+    def stats(self) -> Dict[str, int]:
+        """返回命中、未命中、淘汰次数及当前占用"""
+        with self._lock:
+            return {
+                'hits': self.hits,
+                'misses': self.misses,
+                'evictions': self.evictions,
+                'entries': len(self._entries),
+                'bytes': self._bytes,
+                'pinned': len(self._pinned),
+                'stores': len(self._stores),
+                'max_bytes': self.max_bytes
+            }
+
+
+# 进程级共享实例
+template_cache = TemplateCache()
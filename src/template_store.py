@@ -0,0 +1,213 @@
+"""模板库
+
+将一个目录中的全部模板预先解码后存入单个文件(与流程包相同的容器格式)，
+索引记录每个模板的名称、来源文件信息及各颜色模式版本的数组位置和范数。
+挂载后模板以内存映射的只读视图提供给匹配器，不再逐个解码；
+多个执行进程挂载同一模板库时共享同一份物理内存页。
+
+    python -m template_store build ../click -o click.xmstore
+    python -m template_store update click.xmstore
+    python -m template_store list click.xmstore
+
+模板名称为相对于来源目录的路径，来源目录以相对于模板库文件的路径保存，
+模板库与模板目录一起移动后仍可按原路径匹配。
+"""
+import os
+import sys
+import argparse
+from typing import Any, Dict, Iterable, List, Optional, Tuple
+import cv2
+import numpy as np
+from actions import ColorMode, register_resident_templates
+from pack import read_container, write_container
+from template_cache import CachedTemplate, build_entry, convert_color, template_cache
+
+STORE_EXTENSION = '.xmstore'
+IMAGE_EXTENSIONS = ('.png', '.jpg', '.jpeg', '.bmp')
+
+
+class TemplateStore:
+    """以内存映射方式打开的模板库"""
+    def __init__(self, path: str, root: Optional[str] = None):
+        header, self._arrays = read_container(path)
+        if header.get('kind') != 'templates':
+            raise ValueError(f"不是模板库文件: {path}")
+        self.path = os.path.abspath(path)
+        self.root = os.path.abspath(root or os.path.join(os.path.dirname(self.path), header['root']))
+        self.modes: List[str] = header['modes']
+        # 名称 -> {'mtime_ns', 'size', 'variants': [{'mode', 'array', 'norm'}]}
+        self.templates: Dict[str, Dict[str, Any]] = header['templates']
+        self._entries: Dict[Tuple[str, str], CachedTemplate] = {}
+
+    def __len__(self) -> int:
+        return len(self.templates)
+
+    def __contains__(self, name: str) -> bool:
+        return name in self.templates
+
+    def name_of(self, template_path: str) -> Optional[str]:
+        """模板文件路径对应的库内名称，不在来源目录下时返回None"""
+        try:
+            relative = os.path.relpath(os.path.abspath(template_path), self.root)
+        except ValueError:
+            # Windows 下不在同一驱动器
+            return None
+        if relative == os.pardir or relative.startswith(os.pardir + os.sep):
+            return None
+        return relative.replace(os.sep, '/')
+
+    def paths(self) -> List[str]:
+        """库中全部模板按来源目录还原的路径"""
+        return [os.path.join(self.root, *name.split('/')) for name in self.templates]
+
+    def image(self, name: str, mode: str = ColorMode.BGR) -> Optional[np.ndarray]:
+        """返回模板的只读视图，不拷贝数据"""
+        entry = self._entry(name, mode)
+        return entry.image if entry is not None else None
+
+    def lookup(self, template_path: str, mode: str, scale: float) -> Optional[CachedTemplate]:
+        """供模板缓存查找，库中只保存原始尺寸的版本"""
+        if scale != 1.0:
+            return None
+        name = self.name_of(template_path)
+        return self._entry(name, mode) if name is not None else None
+
+    def _entry(self, name: str, mode: str) -> Optional[CachedTemplate]:
+        entry = self._entries.get((name, mode))
+        if entry is None:
+            record = self.templates.get(name)
+            if record is None:
+                return None
+            for variant in record['variants']:
+                if variant['mode'] == mode:
+                    entry = build_entry(self._arrays[variant['array']], variant['norm'])
+                    self._entries[(name, mode)] = entry
+                    break
+        return entry
+
+
+def attach(store: TemplateStore):
+    """挂载模板库：库中模板由模板缓存直接提供，并视为存在的模板文件"""
+    template_cache.attach_store(store)
+    register_resident_templates(store.paths())
+
+
+def attach_file(path: str):
+    """按文件内容挂载模板库或载入流程包，供工作进程重建常驻模板"""
+    header, _ = read_container(path)
+    if header.get('kind') == 'templates':
+        attach(TemplateStore(path))
+    else:
+        from pack import load_pack
+        load_pack(path)
+
+
+def scan_directory(directory: str) -> Dict[str, str]:
+    """列出目录下的全部模板图像，返回 名称 -> 文件路径"""
+    found = {}
+    for current, _, files in os.walk(directory):
+        for file_name in files:
+            if file_name.lower().endswith(IMAGE_EXTENSIONS):
+                path = os.path.join(current, file_name)
+                found[os.path.relpath(path, directory).replace(os.sep, '/')] = path
+    return dict(sorted(found.items()))
+
+
+def _decode_variants(path: str, modes: Iterable[str]) -> Optional[List[Tuple[str, CachedTemplate]]]:
+    image = cv2.imread(path)
+    if image is None:
+        return None
+    return [(mode, build_entry(convert_color(image, mode))) for mode in modes]
+
+
+def build_store(directory: str, output: str, modes: Iterable[str] = (ColorMode.BGR, ColorMode.GRAY),
+                previous: Optional[TemplateStore] = None) -> Dict[str, int]:
+    """由目录构建模板库，给定 previous 时未变化的模板直接复用其中的数组，不重新解码
+
+    返回新增、更新、复用、删除及无法解码的模板数量。
+    """
+    modes = list(dict.fromkeys([ColorMode.BGR, *modes]))
+    counts = {'added': 0, 'updated': 0, 'reused': 0, 'removed': 0, 'failed': 0}
+    templates: Dict[str, Dict[str, Any]] = {}
+    arrays: List[np.ndarray] = []
+    for name, path in scan_directory(directory).items():
+        stat = os.stat(path)
+        record = previous.templates.get(name) if previous is not None else None
+        if (record is not None and record['mtime_ns'] == stat.st_mtime_ns and record['size'] == stat.st_size
+                and previous.modes == modes):
+            variants = [(mode, previous._entry(name, mode)) for mode in modes]
+            counts['reused'] += 1
+        else:
+            variants = _decode_variants(path, modes)
+            if variants is None:
+                counts['failed'] += 1
+                continue
+            counts['updated' if record is not None else 'added'] += 1
+        templates[name] = {'mtime_ns': stat.st_mtime_ns, 'size': stat.st_size, 'variants': []}
+        for mode, entry in variants:
+            templates[name]['variants'].append({'mode': mode, 'array': len(arrays), 'norm': entry.norm})
+            arrays.append(entry.image)
+    if previous is not None:
+        counts['removed'] = len(set(previous.templates) - set(templates))
+
+    output_dir = os.path.dirname(os.path.abspath(output))
+    header = {
+        'kind': 'templates',
+        'root': os.path.relpath(os.path.abspath(directory), output_dir).replace(os.sep, '/'),
+        'modes': modes,
+        'templates': templates,
+    }
+    write_container(output, header, arrays)
+    return counts
+
+
+def update_store(path: str, directory: Optional[str] = None) -> Dict[str, int]:
+    """按来源目录的当前内容更新模板库，只解码新增和修改过的模板
+
+    已挂载旧模板库的进程继续使用原来的映射，重新挂载后看到新内容。
+    """
+    previous = TemplateStore(path, directory)
+    staging = path + '.new'
+    counts = build_store(previous.root, staging, previous.modes, previous)
+    # 先释放旧文件的映射再替换，Windows 不允许替换仍被映射的文件
+    del previous
+    os.replace(staging, path)
+    return counts
+
+
+def main(argv: Optional[list] = None) -> int:
+    parser = argparse.ArgumentParser(prog="template_store", description="构建和更新模板库")
+    subparsers = parser.add_subparsers(dest='command', required=True)
+    build = subparsers.add_parser('build', help="由模板目录构建模板库")
+    build.add_argument('directory', help="模板目录")
+    build.add_argument('-o', '--output', help=f"输出文件，默认为目录同名的 {STORE_EXTENSION} 文件")
+    build.add_argument('--modes', nargs='*', choices=ColorMode.ALL, default=[ColorMode.GRAY],
+                       help="除彩色原图外预先生成的颜色模式")
+    update = subparsers.add_parser('update', help="按模板目录的变化更新模板库")
+    update.add_argument('store', help="模板库文件")
+    update.add_argument('--directory', help="模板目录，默认为构建时的目录")
+    show = subparsers.add_parser('list', help="列出模板库内容")
+    show.add_argument('store', help="模板库文件")
+    args = parser.parse_args(argv)
+
+    if args.command == 'list':
+        store = TemplateStore(args.store)
+        print(f"{store.path}: {len(store)} 个模板, 来源目录 {store.root}, 颜色模式 {', '.join(store.modes)}")
+        for name in store.templates:
+            h, w = store.image(name).shape[:2]
+            print(f"  {name}  {w}x{h}")
+        return 0
+
+    if args.command == 'build':
+        output = args.output or os.path.normpath(args.directory) + STORE_EXTENSION
+        counts = build_store(args.directory, output, [ColorMode.BGR, *args.modes])
+    else:
+        output = args.store
+        counts = update_store(args.store, args.directory)
+    print(f"已写入 {output}: 新增 {counts['added']}, 更新 {counts['updated']}, 复用 {counts['reused']}, "
+          f"删除 {counts['removed']}, 无法解码 {counts['failed']}, {os.path.getsize(output) / 1024:.1f} KB")
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,147 @@
+"""执行耗时追踪
+
+记录每个动作及其中截屏、颜色转换、匹配、输入、等待等步骤的耗时区间，
+可导出为JSON行或Chrome追踪格式(chrome://tracing、Perfetto 可直接打开)。
+未启用时 span 返回共享的空对象，几乎没有开销。
+"""
+import os
+import json
+import time
+import threading
+from collections import defaultdict
+from typing import Any, Dict, List, Optional
+
+# 区间类别
+CATEGORY_ACTION = "action"
+CATEGORY_CAPTURE = "capture"
+CATEGORY_CONVERT = "convert"
+CATEGORY_MATCH = "match"
+CATEGORY_INPUT = "input"
+CATEGORY_SLEEP = "sleep"
+
+
+class Span:
+    """一个耗时区间，退出 with 块时记录到追踪器"""
+    __slots__ = ('tracer', 'name', 'category', 'args', 'start_ns')
+
+    def __init__(self, tracer: 'Tracer', name: str, category: str, args: Dict[str, Any]):
+        self.tracer = tracer
+        self.name = name
+        self.category = category
+        self.args = args
+        self.start_ns = 0
+
+    def set(self, **args):
+        """补充区间参数，如匹配得分"""
+        self.args.update(args)
+
+    def __enter__(self) -> 'Span':
+        self.start_ns = time.perf_counter_ns()
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.tracer.record(self.name, self.category, self.start_ns, time.perf_counter_ns(), self.args)
+
+
+class _NullSpan:
+    """未启用追踪时使用的空区间"""
+    __slots__ = ()
+
+    def set(self, **args):
+        pass
+
+    def __enter__(self) -> '_NullSpan':
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        pass
+
+
+NULL_SPAN = _NullSpan()
+
+
+class Tracer:
+    """收集耗时区间，线程安全"""
+    def __init__(self, enabled: bool = True):
+        self.enabled = enabled
+        self.events: List[dict] = []
+        self._lock = threading.Lock()
+        self._origin_ns = time.perf_counter_ns()
+
+    def span(self, name: str, category: str, **args):
+        """返回用于 with 语句的区间"""
+        if not self.enabled:
+            return NULL_SPAN
+        return Span(self, name, category, args)
+
+    def record(self, name: str, category: str, start_ns: int, end_ns: int, args: Optional[Dict[str, Any]] = None):
+        """直接记录一个区间，用于开始和结束不在同一处的情况"""
+        if not self.enabled:
+            return
+        thread = threading.current_thread()
+        event = {
+            'name': name,
+            'cat': category,
+            'start_us': (start_ns - self._origin_ns) / 1000,
+            'dur_us': (end_ns - start_ns) / 1000,
+            'thread': thread.name,
+            'tid': thread.ident,
+            'args': args or {},
+        }
+        with self._lock:
+            self.events.append(event)
+
+    def now_ns(self) -> int:
+        return time.perf_counter_ns()
+
+    def summary(self) -> Dict[str, Dict[str, float]]:
+        """按类别汇总次数和总耗时(毫秒)"""
+        totals: Dict[str, Dict[str, float]] = defaultdict(lambda: {'count': 0, 'total_ms': 0.0})
+        with self._lock:
+            for event in self.events:
+                row = totals[event['cat']]
+                row['count'] += 1
+                row['total_ms'] += event['dur_us'] / 1000
+        return {category: {'count': row['count'], 'total_ms': round(row['total_ms'], 3)}
+                for category, row in totals.items()}
+
+    def export_jsonl(self, path: str):
+        """每个区间输出一行JSON"""
+        with self._lock:
+            events = list(self.events)
+        with open(path, 'w', encoding='utf-8') as f:
+            for event in events:
+                f.write(json.dumps(event, ensure_ascii=False) + "\n")
+
+    def export_chrome(self, path: str):
+        """输出Chrome追踪事件格式"""
+        pid = os.getpid()
+        with self._lock:
+            events = list(self.events)
+        trace_events = [{
+            'name': event['name'],
+            'cat': event['cat'],
+            'ph': 'X',
+            'ts': round(event['start_us'], 3),
+            'dur': round(event['dur_us'], 3),
+            'pid': pid,
+            'tid': event['tid'],
+            'args': event['args'],
+        } for event in events]
+        # 线程名称元数据，便于在查看器中区分执行线程、输入线程和并行线程
+        threads = {event['tid']: event['thread'] for event in events}
+        trace_events.extend({'name': 'thread_name', 'ph': 'M', 'pid': pid, 'tid': tid, 'args': {'name': name}}
+                            for tid, name in threads.items())
+        with open(path, 'w', encoding='utf-8') as f:
+            json.dump({'traceEvents': trace_events, 'displayTimeUnit': 'ms'}, f, ensure_ascii=False)
+
+    def export(self, path: str):
+        """按扩展名选择格式：.jsonl 输出JSON行，其他输出Chrome追踪格式"""
+        if path.lower().endswith('.jsonl'):
+            self.export_jsonl(path)
+        else:
+            self.export_chrome(path)
+
+
+# 未启用追踪时共用的实例
+NULL_TRACER = Tracer(enabled=False)
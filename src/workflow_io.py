@@ -0,0 +1,219 @@
+import os
+import json
+from typing import Any, Dict, Iterator, List, Optional, Tuple
+from actions import Action
+
+# 流程级设置的默认值，文件中未出现的项使用默认值
+DEFAULT_SETTINGS: Dict[str, Any] = {
+    'match_backend': 'thread',
+}
+
+
+def read_workflow(file_path: str) -> Tuple[List[Action], Dict[str, Any]]:
+    """读取流程文件，返回动作列表和流程级设置
+
+    兼容三种格式：动作数组，包含 actions 和 settings 的对象，或每行一个动作的JSON行文件；
+    流程包文件交由 pack 载入。
+    """
+    from pack import is_container
+    if is_container(file_path):
+        from pack import load_pack
+        return load_pack(file_path)
+    if is_json_lines(file_path):
+        stream = WorkflowStream(file_path)
+        with stream:
+            return list(stream), stream.settings
+    with open(file_path, 'r', encoding='utf-8') as f:
+        data = json.load(f)
+    settings = dict(DEFAULT_SETTINGS)
+    if isinstance(data, dict):
+        settings.update(data.get('settings', {}))
+        data = data['actions']
+    return [Action.from_dict(item) for item in data], settings
+
+
+def load_workflow(file_path: str) -> List[Action]:
+    """读取 save_workflow 保存的流程文件"""
+    return read_workflow(file_path)[0]
+
+
+def save_workflow(file_path: str, actions: List[Action], settings: Optional[Dict[str, Any]] = None):
+    """将流程保存为JSON数组，有非默认设置时保存为包含 settings 的对象
+
+    扩展名为 .jsonl 时每行写入一个动作，有非默认设置时第一行为 {"settings": ...}。
+    """
+    changed = {key: value for key, value in (settings or {}).items() if DEFAULT_SETTINGS.get(key) != value}
+    if is_json_lines(file_path):
+        with open(file_path, 'w', encoding='utf-8') as f:
+            if changed:
+                f.write(json.dumps({'settings': changed}, ensure_ascii=False) + "\n")
+            for action in actions:
+                f.write(json.dumps(action.to_dict(), ensure_ascii=False) + "\n")
+        return
+    items = [action.to_dict() for action in actions]
+    with open(file_path, 'w', encoding='utf-8') as f:
+        json.dump({'settings': changed, 'actions': items} if changed else items, f)
+
+
+def is_json_lines(file_path: str) -> bool:
+    return file_path.lower().endswith('.jsonl')
+
+
+class WorkflowStream:
+    """逐个读取流程中的顶层动作，不一次性解析整个文件
+
+    JSON行文件逐行解析；JSON数组或对象格式按块读取，用 raw_decode 逐个解析数组元素，
+    内存中只保留当前块。对象格式中 settings 位于 actions 之前时(save_workflow 的写法)，
+    打开后即可读取 settings。支持 len 估算(按已读字节比例)，用于显示进度。
+    """
+    CHUNK_SIZE = 1 << 20
+
+    def __init__(self, file_path: str):
+        self.file_path = file_path
+        self.settings = dict(DEFAULT_SETTINGS)
+        self._lines = is_json_lines(file_path)
+        # JSON行按字节读取，json.loads 直接解析UTF-8字节，已读字节数无需重新编码统计
+        self._file = open(file_path, 'rb') if self._lines else open(file_path, 'r', encoding='utf-8')
+        self._size = max(os.path.getsize(file_path), 1)
+        self._decoder = json.JSONDecoder()
+        self._buffer = ""
+        self._pos = 0
+        self._eof = False
+        self._consumed = 0
+        self._count = 0
+        self._pending: Optional[Dict[str, Any]] = None
+        try:
+            if self._lines:
+                self._read_line_header()
+            else:
+                self._read_json_header()
+        except BaseException:
+            # 文件头无效时调用方拿不到对象，在此关闭文件
+            self._file.close()
+            raise
+
+    def __enter__(self) -> 'WorkflowStream':
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.close()
+
+    def close(self):
+        self._file.close()
+
+    def __iter__(self) -> Iterator[Action]:
+        try:
+            items = self._iter_lines() if self._lines else self._iter_array()
+            for item in items:
+                self._count += 1
+                yield Action.from_dict(item)
+        finally:
+            self.close()
+
+    def __length_hint__(self) -> int:
+        """按已读取的字节比例估算动作总数"""
+        if self._count == 0 or self._consumed == 0:
+            return 0
+        return max(self._count, int(self._count * self._size / self._consumed))
+
+    # JSON行格式
+
+    def _read_line_header(self):
+        for line in self._file:
+            self._consumed += len(line)
+            if not line.strip():
+                continue
+            item = json.loads(line)
+            if 'type' not in item and 'settings' in item:
+                self.settings.update(item['settings'])
+            else:
+                self._pending = item
+            return
+
+    def _iter_lines(self) -> Iterator[Dict[str, Any]]:
+        if self._pending is not None:
+            yield self._pending
+            self._pending = None
+        for line in self._file:
+            self._consumed += len(line)
+            if line.strip():
+                yield json.loads(line)
+
+    # JSON数组和对象格式
+
+    def _fill(self) -> bool:
+        """读入下一块，丢弃已解析的部分，到达文件末尾时返回False"""
+        if self._eof:
+            return False
+        chunk = self._file.read(self.CHUNK_SIZE)
+        if not chunk:
+            self._eof = True
+            return False
+        self._consumed += len(chunk.encode('utf-8'))
+        self._buffer = self._buffer[self._pos:] + chunk
+        self._pos = 0
+        return True
+
+    def _peek(self) -> str:
+        """跳过空白返回下一个字符，文件结束时返回空字符串"""
+        while True:
+            while self._pos < len(self._buffer) and self._buffer[self._pos].isspace():
+                self._pos += 1
+            if self._pos < len(self._buffer):
+                return self._buffer[self._pos]
+            if not self._fill():
+                return ""
+
+    def _expect(self, char: str):
+        if self._peek() != char:
+            raise ValueError(f"流程文件格式错误: 位置 {self._pos} 处应为 '{char}'")
+        self._pos += 1
+
+    def _value(self) -> Any:
+        """解析下一个完整的JSON值，当前块不完整时继续读入"""
+        self._peek()
+        while True:
+            try:
+                value, end = self._decoder.raw_decode(self._buffer, self._pos)
+            except json.JSONDecodeError:
+                if not self._fill():
+                    raise
+                continue
+            # 数字可能被块边界截断，未到文件末尾时确认后面还有分隔符
+            if end == len(self._buffer) and self._fill():
+                continue
+            self._pos = end
+            return value
+
+    def _read_json_header(self):
+        """定位到动作数组的起始位置，途中读取 settings"""
+        first = self._peek()
+        if first == '[':
+            self._pos += 1
+            return
+        self._expect('{')
+        while True:
+            if self._peek() == '}':
+                raise KeyError('actions')
+            key = self._value()
+            self._expect(':')
+            if key == 'actions':
+                self._expect('[')
+                return
+            value = self._value()
+            if key == 'settings':
+                self.settings.update(value)
+            if self._peek() == ',':
+                self._pos += 1
+
+    def _iter_array(self) -> Iterator[Dict[str, Any]]:
+        if self._peek() == ']':
+            return
+        while True:
+            yield self._value()
+            char = self._peek()
+            self._pos += 1
+            if char == ']':
+                return
+            if char != ',':
+                raise ValueError("流程文件格式错误: 动作之间应为 ','")